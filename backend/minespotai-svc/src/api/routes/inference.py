@@ -67,10 +67,18 @@ def get_model() -> MineSpotSegFormer:
     return _model
 
 
+def _resolve_weights_path(path: str) -> str:
+    """Repli sur la variante ``.safetensors`` si le fichier demande est absent."""
+    # L'entrainement ecrit best_f1.safetensors quand safetensors est installe
+    if not Path(path).exists():
+        return str(Path(path).with_suffix(".safetensors"))
+    return path
+
+
 def init_model(weights_path: str | None = None) -> None:
     """Initialiser le modele global au demarrage de l'application."""
     global _model
-    path = weights_path or DEFAULT_WEIGHTS_PATH
+    path = _resolve_weights_path(weights_path or DEFAULT_WEIGHTS_PATH)
     if not Path(path).exists():
         logger.warning(f"Fichier de poids introuvable: {path}. Le modele sera en mode stub.")
         return
@@ -364,7 +372,12 @@ async def list_models() -> ModelsResponse:
     # Repli sur le systeme de fichiers
     models_dir = Path("/models")
     if models_dir.exists():
-        for weight_file in sorted(models_dir.glob("*.pth")) + sorted(models_dir.glob("*.pt")):
+        weight_files = (
+            sorted(models_dir.glob("*.pth"))
+            + sorted(models_dir.glob("*.pt"))
+            + sorted(models_dir.glob("*.safetensors"))
+        )
+        for weight_file in weight_files:
             models_info.append(ModelInfo(
                 name=weight_file.stem,
                 version="local",
@@ -373,7 +386,7 @@ async def list_models() -> ModelsResponse:
             ))
 
     # Ajouter le modele par defaut s'il existe
-    default_path = Path(DEFAULT_WEIGHTS_PATH)
+    default_path = Path(_resolve_weights_path(DEFAULT_WEIGHTS_PATH))
     if default_path.exists() and not any(m.name == default_path.stem for m in models_info):
         models_info.append(ModelInfo(
             name=default_path.stem,
@@ -397,6 +410,7 @@ async def reload_model(request: ReloadRequest | None = None) -> dict:
     weights_path = DEFAULT_WEIGHTS_PATH
     if request and request.weights_path:
         weights_path = request.weights_path
+    weights_path = _resolve_weights_path(weights_path)
 
     if not Path(weights_path).exists():
         raise HTTPException(
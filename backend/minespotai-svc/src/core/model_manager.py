@@ -221,6 +221,9 @@ class ModelManager:
         Retourne True si le chargement a reussi, False sinon.
         """
         weights_path = Path(FALLBACK_WEIGHTS_PATH)
+        # L'entrainement ecrit best_f1.safetensors quand safetensors est installe
+        if not weights_path.exists():
+            weights_path = weights_path.with_suffix(".safetensors")
 
         if not weights_path.exists():
             logger.warning(
@@ -308,7 +308,8 @@ def load_model(
     Instantiate MineSpotSegFormer and load saved weights.
 
     Args:
-        weights_path: Path to a ``.pt`` or ``.pth`` state-dict file.
+        weights_path: Path to a ``.pt``/``.pth`` state-dict file, or a
+                      ``.safetensors`` file written by the training script.
         device: Target device string (e.g. ``"cuda:0"``).  When *None* the
                 function picks CUDA if available, else CPU.
         in_channels: Number of input channels (default 12).
@@ -321,7 +322,12 @@ def load_model(
         device = "cuda" if torch.cuda.is_available() else "cpu"
 
     model = MineSpotSegFormer(in_channels=in_channels, num_classes=num_classes)
-    state_dict = torch.load(weights_path, map_location=device, weights_only=True)
+    if str(weights_path).endswith(".safetensors"):
+        from safetensors.torch import load_file
+
+        state_dict = load_file(weights_path, device=device)
+    else:
+        state_dict = torch.load(weights_path, map_location=device, weights_only=True)
     model.load_state_dict(state_dict)
     model.to(device)
     model.eval()
@@ -426,17 +432,25 @@ class DiceFocalLoss(nn.Module):
     def forward(self, logits: torch.Tensor, targets: torch.Tensor) -> torch.Tensor:
         num_classes = logits.shape[1]
 
+        # Un seul log_softmax partage par la Focal et la Dice ; la probabilite
+        # de la vraie classe est lue par gather (pas de one-hot (B, C, H, W))
+        log_probs = F.log_softmax(logits, dim=1)
+        probs = log_probs.exp()
+        log_pt = log_probs.gather(1, targets.unsqueeze(1)).squeeze(1)
+        pt = log_pt.exp()
+
         # Focal Loss
-        ce = F.cross_entropy(logits, targets, reduction='none')
-        pt = torch.exp(-ce)
+        ce = -log_pt
         focal_loss = (self.alpha * (1 - pt) ** self.gamma * ce).mean()
 
-        # Dice Loss
-        probs = F.softmax(logits, dim=1)
-        targets_oh = F.one_hot(targets, num_classes).permute(0, 3, 1, 2).float()
-        dims = (0, 2, 3)
-        intersection = (probs * targets_oh).sum(dim=dims)
-        union = probs.sum(dim=dims) + targets_oh.sum(dim=dims)
+        # Dice Loss : intersection par classe = somme de pt sur les pixels de
+        # cette classe ; effectifs cibles par le meme scatter_add_ (taille
+        # fixe : ni synchronisation hote comme bincount, ni rupture de graphe)
+        flat_targets = targets.reshape(-1)
+        zeros = torch.zeros(num_classes, dtype=probs.dtype, device=probs.device)
+        intersection = zeros.scatter_add(0, flat_targets, pt.reshape(-1))
+        target_counts = zeros.scatter_add(0, flat_targets, torch.ones_like(pt).reshape(-1))
+        union = probs.sum(dim=(0, 2, 3)) + target_counts
         dice = (2.0 * intersection + 1.0) / (union + 1.0)
         dice_loss = 1.0 - dice.mean()
 
@@ -36,84 +36,112 @@ PATCH_SIZE = 256
 SEED = 42
 
 
-def _generate_mining_patch(rng: np.random.Generator) -> np.ndarray:
+def _channel_bounds(bounds: list[tuple[float, float]]) -> tuple[np.ndarray, np.ndarray]:
     """
-    Generer un patch positif (site d'orpaillage).
-    Caracteristiques : VV/VH eleves, NDVI tres bas (<0.2), BSI eleve, turbidite eau.
+    Convertir des bornes (min, max) par canal en tableaux (biais, echelle)
+    de forme (NUM_CHANNELS, 1, 1), diffusables sur un patch complet.
     """
-    patch = np.zeros((NUM_CHANNELS, PATCH_SIZE, PATCH_SIZE), dtype=np.float32)
-
-    # Sol nu / degrade - reflectances elevees dans le visible
-    patch[0] = rng.uniform(0.15, 0.35, (PATCH_SIZE, PATCH_SIZE))  # Blue
-    patch[1] = rng.uniform(0.18, 0.40, (PATCH_SIZE, PATCH_SIZE))  # Green
-    patch[2] = rng.uniform(0.20, 0.45, (PATCH_SIZE, PATCH_SIZE))  # Red
-
-    # Red Edge - faible vegetation
-    patch[3] = rng.uniform(0.12, 0.25, (PATCH_SIZE, PATCH_SIZE))
-    patch[4] = rng.uniform(0.10, 0.22, (PATCH_SIZE, PATCH_SIZE))
-    patch[5] = rng.uniform(0.08, 0.20, (PATCH_SIZE, PATCH_SIZE))
-
-    # NIR tres bas (pas de vegetation)
-    patch[6] = rng.uniform(0.05, 0.18, (PATCH_SIZE, PATCH_SIZE))
+    arr = np.asarray(bounds, dtype=np.float32)
+    biases = arr[:, 0].reshape(NUM_CHANNELS, 1, 1)
+    scales = (arr[:, 1] - arr[:, 0]).reshape(NUM_CHANNELS, 1, 1)
+    return biases, scales
 
-    # SWIR eleve (sol nu)
-    patch[7] = rng.uniform(0.25, 0.50, (PATCH_SIZE, PATCH_SIZE))
-    patch[8] = rng.uniform(0.20, 0.45, (PATCH_SIZE, PATCH_SIZE))
 
-    # NDVI tres bas (< 0.2) - sol degrade
-    patch[9] = rng.uniform(-0.1, 0.15, (PATCH_SIZE, PATCH_SIZE))
-
-    # SAR VV/VH eleves (terrain perturbe, machinerie)
-    patch[10] = rng.uniform(0.4, 0.85, (PATCH_SIZE, PATCH_SIZE))  # VV
-    patch[11] = rng.uniform(0.3, 0.75, (PATCH_SIZE, PATCH_SIZE))  # VH
+def _uniform_patch(
+    rng: np.random.Generator,
+    bounds: tuple[np.ndarray, np.ndarray],
+    out: np.ndarray,
+) -> np.ndarray:
+    """
+    Tirer les 12 canaux en un seul appel RNG directement dans `out`, puis
+    appliquer echelle et biais en place (au lieu de 12 appels rng.uniform).
+    """
+    biases, scales = bounds
+    rng.random(dtype=np.float32, out=out)
+    out *= scales
+    out += biases
+    return out
+
+
+# Bornes uniformes (min, max) par canal et par classe
+MINING_BOUNDS = _channel_bounds([
+    (0.15, 0.35), (0.18, 0.40), (0.20, 0.45),   # Sol nu / degrade - visible eleve
+    (0.12, 0.25), (0.10, 0.22), (0.08, 0.20),   # Red Edge - faible vegetation
+    (0.05, 0.18),                               # NIR tres bas (pas de vegetation)
+    (0.25, 0.50), (0.20, 0.45),                 # SWIR eleve (sol nu)
+    (-0.1, 0.15),                               # NDVI tres bas (< 0.2) - sol degrade
+    (0.4, 0.85), (0.3, 0.75),                   # SAR VV/VH eleves (terrain perturbe, machinerie)
+])
+
+# Taches d'eau turbide des sites d'orpaillage : Blue, NIR, NDVI
+WATER_SPOT_CHANNELS = (0, 6, 9)
+WATER_SPOT_BIASES = np.array([0.05, 0.02, -0.3], dtype=np.float32).reshape(-1, 1, 1)
+WATER_SPOT_SCALES = np.array([0.07, 0.06, 0.2], dtype=np.float32).reshape(-1, 1, 1)
+
+FOREST_BOUNDS = _channel_bounds([
+    (0.02, 0.06), (0.03, 0.08), (0.02, 0.05),   # Vegetation dense - faible visible
+    (0.10, 0.25), (0.20, 0.40), (0.30, 0.50),
+    (0.35, 0.60),                               # NIR fort
+    (0.10, 0.20), (0.08, 0.15),
+    (0.60, 0.90),                               # NDVI > 0.6
+    (0.10, 0.30), (0.05, 0.20),                 # VV/VH faibles
+])
+
+AGRICULTURE_BOUNDS = _channel_bounds([
+    (0.05, 0.12), (0.08, 0.18), (0.06, 0.15),   # Vegetation moderee
+    (0.12, 0.28), (0.18, 0.35), (0.22, 0.38),
+    (0.20, 0.40),                               # NIR moyen
+    (0.12, 0.25), (0.10, 0.22),
+    (0.30, 0.60),                               # NDVI cyclique
+    (0.15, 0.35), (0.10, 0.25),
+])
+
+WATER_BOUNDS = _channel_bounds([
+    (0.05, 0.15), (0.04, 0.12), (0.02, 0.08),   # Blue eleve relatif
+    (0.01, 0.05), (0.01, 0.04), (0.01, 0.03),
+    (0.005, 0.03),                              # NIR tres bas
+    (0.002, 0.02), (0.001, 0.015),              # Absorption forte SWIR
+    (-0.5, -0.1),                               # NDVI negatif
+    (0.02, 0.10), (0.01, 0.06),                 # VV/VH faibles
+])
+
+URBAN_BOUNDS = _channel_bounds([
+    (0.10, 0.25), (0.12, 0.28), (0.12, 0.30),   # Reflectances mixtes
+    (0.10, 0.22), (0.10, 0.20), (0.10, 0.20),
+    (0.12, 0.25),
+    (0.15, 0.35), (0.12, 0.30),
+    (0.05, 0.25),                               # NDVI faible
+    (0.25, 0.55), (0.15, 0.40),                 # VV moyen-eleve, VH moyen
+])
+
+
+def _generate_mining_patch(rng: np.random.Generator, out: np.ndarray) -> np.ndarray:
+    """
+    Generer un patch positif (site d'orpaillage).
+    Caracteristiques : VV/VH eleves, NDVI tres bas (<0.2), BSI eleve, turbidite eau.
+    """
+    patch = _uniform_patch(rng, MINING_BOUNDS, out)
 
-    # Ajouter des taches d'eau turbide (mercure) dans ~20% du patch
-    water_mask = rng.random((PATCH_SIZE, PATCH_SIZE)) < 0.2
-    patch[0, water_mask] = rng.uniform(0.05, 0.12, water_mask.sum())
-    patch[6, water_mask] = rng.uniform(0.02, 0.08, water_mask.sum())
-    patch[9, water_mask] = rng.uniform(-0.3, -0.1, water_mask.sum())
+    # Ajouter des taches d'eau turbide (mercure) dans ~20% du patch :
+    # un tirage pleine grille par canal, recopie sous le masque en une passe
+    water_mask = rng.random((PATCH_SIZE, PATCH_SIZE), dtype=np.float32) < 0.2
+    wet = rng.random((len(WATER_SPOT_CHANNELS), PATCH_SIZE, PATCH_SIZE), dtype=np.float32)
+    wet *= WATER_SPOT_SCALES
+    wet += WATER_SPOT_BIASES
+    for k, channel in enumerate(WATER_SPOT_CHANNELS):
+        np.copyto(patch[channel], wet[k], where=water_mask)
 
     return patch
 
 
-def _generate_forest_patch(rng: np.random.Generator) -> np.ndarray:
+def _generate_forest_patch(rng: np.random.Generator, out: np.ndarray) -> np.ndarray:
     """Generer un patch foret (negatif). NDVI > 0.6."""
-    patch = np.zeros((NUM_CHANNELS, PATCH_SIZE, PATCH_SIZE), dtype=np.float32)
-
-    # Vegetation dense - faible visible, fort NIR
-    patch[0] = rng.uniform(0.02, 0.06, (PATCH_SIZE, PATCH_SIZE))  # Blue
-    patch[1] = rng.uniform(0.03, 0.08, (PATCH_SIZE, PATCH_SIZE))  # Green
-    patch[2] = rng.uniform(0.02, 0.05, (PATCH_SIZE, PATCH_SIZE))  # Red
-    patch[3] = rng.uniform(0.10, 0.25, (PATCH_SIZE, PATCH_SIZE))
-    patch[4] = rng.uniform(0.20, 0.40, (PATCH_SIZE, PATCH_SIZE))
-    patch[5] = rng.uniform(0.30, 0.50, (PATCH_SIZE, PATCH_SIZE))
-    patch[6] = rng.uniform(0.35, 0.60, (PATCH_SIZE, PATCH_SIZE))  # NIR fort
-    patch[7] = rng.uniform(0.10, 0.20, (PATCH_SIZE, PATCH_SIZE))
-    patch[8] = rng.uniform(0.08, 0.15, (PATCH_SIZE, PATCH_SIZE))
-    patch[9] = rng.uniform(0.60, 0.90, (PATCH_SIZE, PATCH_SIZE))  # NDVI > 0.6
-    patch[10] = rng.uniform(0.10, 0.30, (PATCH_SIZE, PATCH_SIZE))  # VV faible
-    patch[11] = rng.uniform(0.05, 0.20, (PATCH_SIZE, PATCH_SIZE))  # VH faible
-
-    return patch
+    return _uniform_patch(rng, FOREST_BOUNDS, out)
 
 
-def _generate_agriculture_patch(rng: np.random.Generator) -> np.ndarray:
+def _generate_agriculture_patch(rng: np.random.Generator, out: np.ndarray) -> np.ndarray:
     """Generer un patch agriculture (negatif). NDVI 0.3-0.6 cyclique."""
-    patch = np.zeros((NUM_CHANNELS, PATCH_SIZE, PATCH_SIZE), dtype=np.float32)
-
-    # Vegetation moderee avec pattern regulier (parcelles)
-    patch[0] = rng.uniform(0.05, 0.12, (PATCH_SIZE, PATCH_SIZE))
-    patch[1] = rng.uniform(0.08, 0.18, (PATCH_SIZE, PATCH_SIZE))
-    patch[2] = rng.uniform(0.06, 0.15, (PATCH_SIZE, PATCH_SIZE))
-    patch[3] = rng.uniform(0.12, 0.28, (PATCH_SIZE, PATCH_SIZE))
-    patch[4] = rng.uniform(0.18, 0.35, (PATCH_SIZE, PATCH_SIZE))
-    patch[5] = rng.uniform(0.22, 0.38, (PATCH_SIZE, PATCH_SIZE))
-    patch[6] = rng.uniform(0.20, 0.40, (PATCH_SIZE, PATCH_SIZE))  # NIR moyen
-    patch[7] = rng.uniform(0.12, 0.25, (PATCH_SIZE, PATCH_SIZE))
-    patch[8] = rng.uniform(0.10, 0.22, (PATCH_SIZE, PATCH_SIZE))
-    patch[9] = rng.uniform(0.30, 0.60, (PATCH_SIZE, PATCH_SIZE))  # NDVI cyclique
-    patch[10] = rng.uniform(0.15, 0.35, (PATCH_SIZE, PATCH_SIZE))
-    patch[11] = rng.uniform(0.10, 0.25, (PATCH_SIZE, PATCH_SIZE))
+    patch = _uniform_patch(rng, AGRICULTURE_BOUNDS, out)
 
     # Ajouter des lignes regulieres (sillons agricoles)
     for i in range(0, PATCH_SIZE, 16):
@@ -124,44 +152,14 @@ def _generate_agriculture_patch(rng: np.random.Generator) -> np.ndarray:
     return patch
 
 
-def _generate_water_patch(rng: np.random.Generator) -> np.ndarray:
+def _generate_water_patch(rng: np.random.Generator, out: np.ndarray) -> np.ndarray:
     """Generer un patch eau (negatif). NDWI > 0.3."""
-    patch = np.zeros((NUM_CHANNELS, PATCH_SIZE, PATCH_SIZE), dtype=np.float32)
-
-    # Eau - absorption forte dans NIR/SWIR
-    patch[0] = rng.uniform(0.05, 0.15, (PATCH_SIZE, PATCH_SIZE))  # Blue eleve relatif
-    patch[1] = rng.uniform(0.04, 0.12, (PATCH_SIZE, PATCH_SIZE))
-    patch[2] = rng.uniform(0.02, 0.08, (PATCH_SIZE, PATCH_SIZE))
-    patch[3] = rng.uniform(0.01, 0.05, (PATCH_SIZE, PATCH_SIZE))
-    patch[4] = rng.uniform(0.01, 0.04, (PATCH_SIZE, PATCH_SIZE))
-    patch[5] = rng.uniform(0.01, 0.03, (PATCH_SIZE, PATCH_SIZE))
-    patch[6] = rng.uniform(0.005, 0.03, (PATCH_SIZE, PATCH_SIZE))  # NIR tres bas
-    patch[7] = rng.uniform(0.002, 0.02, (PATCH_SIZE, PATCH_SIZE))
-    patch[8] = rng.uniform(0.001, 0.015, (PATCH_SIZE, PATCH_SIZE))
-    patch[9] = rng.uniform(-0.5, -0.1, (PATCH_SIZE, PATCH_SIZE))  # NDVI negatif
-    patch[10] = rng.uniform(0.02, 0.10, (PATCH_SIZE, PATCH_SIZE))  # VV faible
-    patch[11] = rng.uniform(0.01, 0.06, (PATCH_SIZE, PATCH_SIZE))  # VH faible
-
-    return patch
+    return _uniform_patch(rng, WATER_BOUNDS, out)
 
 
-def _generate_urban_patch(rng: np.random.Generator) -> np.ndarray:
+def _generate_urban_patch(rng: np.random.Generator, out: np.ndarray) -> np.ndarray:
     """Generer un patch urbain (negatif)."""
-    patch = np.zeros((NUM_CHANNELS, PATCH_SIZE, PATCH_SIZE), dtype=np.float32)
-
-    # Zones urbaines - reflectances mixtes, structures regulieres
-    patch[0] = rng.uniform(0.10, 0.25, (PATCH_SIZE, PATCH_SIZE))
-    patch[1] = rng.uniform(0.12, 0.28, (PATCH_SIZE, PATCH_SIZE))
-    patch[2] = rng.uniform(0.12, 0.30, (PATCH_SIZE, PATCH_SIZE))
-    patch[3] = rng.uniform(0.10, 0.22, (PATCH_SIZE, PATCH_SIZE))
-    patch[4] = rng.uniform(0.10, 0.20, (PATCH_SIZE, PATCH_SIZE))
-    patch[5] = rng.uniform(0.10, 0.20, (PATCH_SIZE, PATCH_SIZE))
-    patch[6] = rng.uniform(0.12, 0.25, (PATCH_SIZE, PATCH_SIZE))
-    patch[7] = rng.uniform(0.15, 0.35, (PATCH_SIZE, PATCH_SIZE))
-    patch[8] = rng.uniform(0.12, 0.30, (PATCH_SIZE, PATCH_SIZE))
-    patch[9] = rng.uniform(0.05, 0.25, (PATCH_SIZE, PATCH_SIZE))  # NDVI faible
-    patch[10] = rng.uniform(0.25, 0.55, (PATCH_SIZE, PATCH_SIZE))  # VV moyen-eleve
-    patch[11] = rng.uniform(0.15, 0.40, (PATCH_SIZE, PATCH_SIZE))  # VH moyen
+    patch = _uniform_patch(rng, URBAN_BOUNDS, out)
 
     # Ajouter des structures en grille (routes/batiments)
     for i in range(0, PATCH_SIZE, 32):
@@ -175,13 +173,23 @@ def _generate_urban_patch(rng: np.random.Generator) -> np.ndarray:
 # Generation du dataset complet
 # ---------------------------------------------------------------------------
 
+def _make_rng(seed: int) -> np.random.Generator:
+    """
+    Creer le generateur aleatoire du dataset.
+    SFC64 est plus rapide que PCG64 (defaut de default_rng) pour les tirages
+    uniformes float32 en masse ; le dataset reste reproductible pour une graine
+    donnee, mais differe de celui produit avec PCG64.
+    """
+    return np.random.Generator(np.random.SFC64(seed))
+
+
 def generate_dataset(
     output_dir: str,
     num_patches: int = 200,
     seed: int = SEED,
 ) -> None:
     """Generer le dataset synthetique complet."""
-    rng = np.random.default_rng(seed)
+    rng = _make_rng(seed)
     output_path = Path(output_dir)
     patches_dir = output_path / "sample_patches"
     patches_dir.mkdir(parents=True, exist_ok=True)
@@ -200,58 +208,52 @@ def generate_dataset(
     print(f"  Positifs (orpaillage): {num_positive}")
     print(f"  Foret: {num_forest}, Agriculture: {num_agriculture}, Eau: {num_water}, Urbain: {num_urban}")
 
-    all_patches = []
-    all_labels = []
-
-    # Positifs (label = 1)
-    for i in range(num_positive):
-        patch = _generate_mining_patch(rng)
-        all_patches.append(patch)
-        all_labels.append(1)
-        if (i + 1) % 20 == 0:
-            print(f"  Positifs: {i + 1}/{num_positive}")
-
-    # Negatifs (label = 0)
-    generators = (
-        [(_generate_forest_patch, num_forest, "foret")],
-    )
-    neg_configs = [
+    # Planifier la classe de chaque patch avant toute generation
+    class_configs = [
+        (_generate_mining_patch, num_positive, "orpaillage"),
         (_generate_forest_patch, num_forest, "foret"),
         (_generate_agriculture_patch, num_agriculture, "agriculture"),
         (_generate_water_patch, num_water, "eau"),
         (_generate_urban_patch, num_urban, "urbain"),
     ]
+    class_ids = np.repeat(
+        np.arange(len(class_configs)),
+        [count for _, count, _ in class_configs],
+    )
+    labels_array = (class_ids == 0).astype(np.uint8)  # 1 = orpaillage
+    total = len(labels_array)
 
-    for gen_func, count, name in neg_configs:
-        for i in range(count):
-            patch = gen_func(rng)
-            all_patches.append(patch)
-            all_labels.append(0)
-        print(f"  Negatifs ({name}): {count}")
-
-    # Sauvegarder chaque patch en .npy
-    print(f"\nSauvegarde de {len(all_patches)} patches...")
-    for i, patch in enumerate(all_patches):
-        np.save(patches_dir / f"patch_{i:05d}.npy", patch)
-
-    # Creer le split train/val/test
-    indices = rng.permutation(len(all_patches))
-    n_train = int(len(all_patches) * 0.7)
-    n_val = int(len(all_patches) * 0.15)
+    # Creer le split train/val/test et choisir les patches de la preview
+    indices = rng.permutation(total)
+    n_train = int(total * 0.7)
+    n_val = int(total * 0.15)
 
     train_idx = indices[:n_train].tolist()
     val_idx = indices[n_train:n_train + n_val].tolist()
     test_idx = indices[n_train + n_val:].tolist()
 
+    preview_idx = _select_preview_indices(labels_array, rng)
+
+    # Generer et ecrire chaque patch dans un buffer de travail unique
+    # (12x256x256 float32) reutilise par tous les generateurs.
+    scratch = np.empty((NUM_CHANNELS, PATCH_SIZE, PATCH_SIZE), dtype=np.float32)
+    for i, class_id in enumerate(class_ids):
+        gen_func = class_configs[class_id][0]
+        np.save(patches_dir / f"patch_{i:05d}.npy", gen_func(rng, scratch))
+        if (i + 1) % 20 == 0:
+            print(f"  Patches: {i + 1}/{total}")
+
+    print(f"\n{total} patches sauvegardes")
+
     # annotations.json
     annotations = {
-        "total_patches": len(all_patches),
+        "total_patches": total,
         "num_channels": NUM_CHANNELS,
         "patch_size": PATCH_SIZE,
         "positive_count": num_positive,
         "negative_count": num_negative,
-        "patches": [f"patch_{i:05d}.npy" for i in range(len(all_patches))],
-        "labels": all_labels,
+        "patches": [f"patch_{i:05d}.npy" for i in range(total)],
+        "labels": labels_array.tolist(),
         "split": {
             "train": train_idx,
             "val": val_idx,
@@ -265,22 +267,33 @@ def generate_dataset(
     }
 
     with open(patches_dir / "annotations.json", "w") as f:
-        json.dump(annotations, f, indent=2)
+        json.dump(annotations, f, separators=(",", ":"))
 
     print(f"  annotations.json sauvegarde")
     print(f"  Split: train={len(train_idx)}, val={len(val_idx)}, test={len(test_idx)}")
 
     # Generer preview.png (grille 4x4 RGB fausse couleur)
-    _generate_preview(all_patches, all_labels, patches_dir, rng)
+    _generate_preview(labels_array, preview_idx, patches_dir)
 
     print(f"\nDataset genere dans {patches_dir}")
 
 
+def _select_preview_indices(
+    labels: np.ndarray,
+    rng: np.random.Generator,
+) -> list[int]:
+    """Selectionner 8 positifs + 8 negatifs pour la preview."""
+    pos_idx = np.flatnonzero(labels == 1)
+    neg_idx = np.flatnonzero(labels == 0)
+    selected = rng.choice(pos_idx, min(8, len(pos_idx)), replace=False).tolist()
+    selected += rng.choice(neg_idx, min(8, len(neg_idx)), replace=False).tolist()
+    return selected
+
+
 def _generate_preview(
-    patches: list[np.ndarray],
-    labels: list[int],
+    labels: np.ndarray,
+    selected: list[int],
     output_dir: Path,
-    rng: np.random.Generator,
 ) -> None:
     """Generer une grille 4x4 de patches en RGB fausse couleur (NIR, Red, Green)."""
     try:
@@ -291,26 +304,21 @@ def _generate_preview(
         print("  [WARN] matplotlib non disponible - preview.png non genere")
         return
 
-    # Selectionner 8 positifs + 8 negatifs
-    pos_idx = [i for i, l in enumerate(labels) if l == 1]
-    neg_idx = [i for i, l in enumerate(labels) if l == 0]
-    selected = list(rng.choice(pos_idx, min(8, len(pos_idx)), replace=False))
-    selected += list(rng.choice(neg_idx, min(8, len(neg_idx)), replace=False))
-
     fig, axes = plt.subplots(4, 4, figsize=(16, 16))
     fig.suptitle("Ge O'Miner - Dataset Preview (NIR-R-G False Color)", fontsize=16, fontweight="bold")
 
     for ax_idx, (ax, patch_idx) in enumerate(zip(axes.flat, selected)):
-        patch = patches[patch_idx]
+        patch = np.load(output_dir / f"patch_{patch_idx:05d}.npy", mmap_mode="r")
         label = labels[patch_idx]
 
-        # Fausse couleur : NIR (ch6), Red (ch2), Green (ch1)
-        rgb = np.stack([patch[6], patch[2], patch[1]], axis=-1)
+        # Fausse couleur : NIR (ch6), Red (ch2), Green (ch1), sous-echantillonnee
+        # en 64x64 (visuellement identique a 100 dpi, 16x moins de pixels)
+        rgb = np.stack([patch[6, ::4, ::4], patch[2, ::4, ::4], patch[1, ::4, ::4]], axis=-1)
         # Normaliser entre 0 et 1
         rgb_min = rgb.min()
-        rgb_max = rgb.max()
-        if rgb_max > rgb_min:
-            rgb = (rgb - rgb_min) / (rgb_max - rgb_min)
+        rgb_ptp = float(rgb.max() - rgb_min)
+        if rgb_ptp > 0:
+            rgb = (rgb - rgb_min) * (1.0 / rgb_ptp)
         else:
             rgb = np.zeros_like(rgb)
 
@@ -354,7 +362,10 @@ def main() -> None:
         "--seed",
         type=int,
         default=SEED,
-        help="Graine aleatoire pour reproductibilite (default: 42)",
+        help=(
+            "Graine aleatoire pour reproductibilite, appliquee au generateur "
+            "SFC64 (default: 42)"
+        ),
     )
 
     args = parser.parse_args()
@@ -13,28 +13,38 @@ Usage:
         --batch-size 8 \
         --lr 3e-4 \
         --device cuda
+
+Multi-GPU (DistributedDataParallel, un processus par GPU):
+    torchrun --nproc_per_node 4 train.py --data-dir /data/prepared
 """
 
 from __future__ import annotations
 
 import argparse
+import contextlib
+import hashlib
+import json
 import os
 import random
 import sys
+import threading
 import time
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import Callable, Dict, List, Tuple
 
 import matplotlib
 matplotlib.use("Agg")  # Backend non-interactif pour la generation d'images
 import matplotlib.pyplot as plt
 import numpy as np
 import torch
+import torch.distributed as dist
 import torch.nn as nn
 import torch.nn.functional as F
+from torch.nn.parallel import DistributedDataParallel as DDP
 from torch.optim import AdamW
 from torch.optim.lr_scheduler import CosineAnnealingWarmRestarts
 from torch.utils.data import DataLoader, Dataset
+from torch.utils.data.distributed import DistributedSampler
 from tqdm import tqdm
 
 # ---------------------------------------------------------------------------
@@ -56,6 +66,13 @@ try:
 except ImportError:
     MLFLOW_AVAILABLE = False
 
+# safetensors (optionnel, repli sur torch.save si absent)
+try:
+    from safetensors.torch import save_file as save_safetensors
+    SAFETENSORS_AVAILABLE = True
+except ImportError:
+    SAFETENSORS_AVAILABLE = False
+
 
 # ---------------------------------------------------------------------------
 # Dataset avec augmentation
@@ -80,49 +97,267 @@ class MiningPatchDataset(Dataset):
             masks/
                 patch_00000.npy  # (H, W) uint8
                 ...
+            images_packed.npy    # (N, C, H, W) int16 quantifie, optionnel (prepack)
+            images_packed.json   # offset/echelle par canal + empreinte des patches
+            masks_packed.npy     # (N, H, W) uint8, optionnel (prepack)
+            _index.txt           # liste triee des patches (cache)
+
+    La liste triee des noms de patches est mise en cache dans ``_index.txt``
+    et reutilisee tant que ``images/`` n'a pas ete modifie depuis.
+
+    Si les archives ``*_packed.npy`` existent et que l'empreinte des patches
+    enregistree dans ``images_packed.json`` est a jour, elles sont ouvertes
+    en memory-map et indexees directement au lieu d'ouvrir deux fichiers par
+    echantillon ; avec ``pack``, une archive absente ou perimee est
+    reconstruite. Les images quantifiees sont alors rendues en int16 et les
+    masques en uint8 : ``quant_params`` donne l'offset et l'echelle pour
+    repasser en float32 sur le device (voir :class:`_CudaPrefetcher`). Avec
+    ``augment``, la conversion reste faite dans le worker.
     """
 
-    def __init__(self, root: str, augment: bool = False) -> None:
+    IMAGES_PACK = "images_packed.npy"
+    IMAGES_PACK_META = "images_packed.json"
+    MASKS_PACK = "masks_packed.npy"
+    INDEX_FILE = "_index.txt"
+    # Amplitude symetrique de la quantification int16
+    QUANT_MAX = 32767
+
+    def __init__(self, root: str, augment: bool = False, pack: bool = False) -> None:
         self.root = Path(root)
         self.img_dir = self.root / "images"
         self.msk_dir = self.root / "masks"
         self.augment = augment
 
-        self.files = sorted(self.img_dir.glob("*.npy"))
+        self.files = self._list_files()
         if not self.files:
             raise FileNotFoundError(f"Aucun fichier .npy trouve dans {self.img_dir}")
 
+        # Empreinte calculee a la demande (2N stat()), seulement si une
+        # archive existe ou doit etre construite
+        self._fingerprint_cache: Dict[str, object] | None = None
+        packs = self._open_packs()
+        if pack and packs[0] is None:
+            self.prepack()
+            packs = self._open_packs()
+        self.img_pack, self.msk_pack, self._qparams = packs
+        # Parametres de dequantification a appliquer apres transfert,
+        # None si __getitem__ rend deja des images float32
+        self.quant_params = None if augment else self._qparams
+
     def __len__(self) -> int:
         return len(self.files)
 
-    def __getitem__(self, idx: int) -> Tuple[torch.Tensor, torch.Tensor]:
-        img_path = self.files[idx]
-        msk_path = self.msk_dir / img_path.name
+    def _list_files(self) -> List[str]:
+        """
+        Noms tries des patches, lus depuis ``_index.txt`` s'il est a jour.
 
-        image = np.load(img_path).astype(np.float32)   # (C, H, W)
-        mask = np.load(msk_path).astype(np.int64)       # (H, W)
+        L'index est perime des que le repertoire ``images/`` est plus recent
+        (ajout ou suppression de fichiers) ; il est alors regenere.
+        """
+        index_path = self.root / self.INDEX_FILE
+        try:
+            if index_path.stat().st_mtime >= self.img_dir.stat().st_mtime:
+                return index_path.read_text().split()
+        except OSError:
+            pass
+
+        files = sorted(p.name for p in self.img_dir.glob("*.npy"))
+        if files:
+            tmp_path = index_path.with_suffix(".txt.tmp")
+            try:
+                tmp_path.write_text("\n".join(files) + "\n")
+                os.replace(tmp_path, index_path)
+            except OSError as e:
+                print(f"Avertissement: index {index_path} non ecrit: {e}")
+        return files
+
+    def _fingerprint(self) -> Dict[str, object]:
+        """
+        Empreinte des patches sources, enregistree avec l'archive.
+
+        Combine le mtime de ``images/`` et la liste des noms (comme
+        :meth:`_list_files`) avec le mtime le plus recent des fichiers image et
+        masque : une regeneration a noms et nombre identiques la change aussi.
+        Calculee une seule fois par instance (un ``stat()`` par fichier).
+        """
+        if self._fingerprint_cache is not None:
+            return self._fingerprint_cache
+        newest = max(
+            (directory / name).stat().st_mtime_ns
+            for directory in (self.img_dir, self.msk_dir)
+            for name in self.files
+        )
+        self._fingerprint_cache = {
+            "images_mtime_ns": self.img_dir.stat().st_mtime_ns,
+            "files_sha1": hashlib.sha1("\n".join(self.files).encode()).hexdigest(),
+            "newest_patch_mtime_ns": newest,
+        }
+        return self._fingerprint_cache
+
+    def _load_patch(self, idx: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Charger un patch depuis ses fichiers ``.npy`` individuels.
+
+        Les fichiers sont ouverts en memory-map : la conversion de type lit
+        directement depuis le cache de pages, sans tampon intermediaire.
+        Les types etroits sont conserves jusqu'au device : images float16
+        laissees en float16, masques dans leur type stocke (uint8), la
+        conversion float32/int64 etant faite par :class:`_CudaPrefetcher`.
+        """
+        name = self.files[idx]
+        img_path = self.img_dir / name
+        msk_path = self.msk_dir / name
+
+        image = np.load(img_path, mmap_mode="r")
+        img_dtype = np.float16 if image.dtype == np.float16 else np.float32
+        image = np.array(image, dtype=img_dtype)                 # (C, H, W)
+        mask = np.array(np.load(msk_path, mmap_mode="r"))        # (H, W)
 
         # Remplacement des NaN par 0
-        image = np.nan_to_num(image, nan=0.0)
+        np.nan_to_num(image, copy=False, nan=0.0)
+        return image, mask
+
+    def _open_packs(self) -> Tuple[
+        np.ndarray | None, np.ndarray | None, Tuple[np.ndarray, np.ndarray] | None
+    ]:
+        """
+        Ouvrir les archives en memory-map si leur empreinte est a jour.
+
+        Retourne aussi ``(offset, echelle)`` de forme (C, 1, 1) pour
+        dequantifier les images int16. Une archive sans empreinte (ancien
+        format) ou dont l'empreinte differe de :meth:`_fingerprint` est
+        ignoree ; l'empreinte n'est calculee que si les archives existent.
+        """
+        img_path = self.root / self.IMAGES_PACK
+        msk_path = self.root / self.MASKS_PACK
+        if not (img_path.exists() and msk_path.exists()):
+            return None, None, None
+
+        try:
+            with open(self.root / self.IMAGES_PACK_META) as f:
+                meta = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Avertissement: metadonnees d'archive illisibles ({e}), "
+                  f"archive ignoree dans {self.root}")
+            return None, None, None
+
+        if meta.get("fingerprint") != self._fingerprint():
+            print(f"Avertissement: archive perimee ignoree dans {self.root}")
+            return None, None, None
+
+        img_pack = np.load(img_path, mmap_mode="r")
+        msk_pack = np.load(msk_path, mmap_mode="r")
+        if len(img_pack) != len(self.files) or len(msk_pack) != len(self.files):
+            print(f"Avertissement: archive incomplete ignoree dans {self.root}")
+            return None, None, None
+
+        offset = np.asarray(meta["offset"], dtype=np.float32).reshape(-1, 1, 1)
+        scale = np.asarray(meta["scale"], dtype=np.float32).reshape(-1, 1, 1)
+        return img_pack, msk_pack, (offset, scale)
+
+    def prepack(self) -> None:
+        """
+        Regrouper tous les patches dans deux archives ``.npy`` memory-mappables.
+
+        Les images (deja nettoyees, NaN -> 0) sont quantifiees en int16 avec
+        un offset et une echelle par canal calcules sur une premiere passe
+        (moitie moins d'octets a lire et a transferer que float32) ; les
+        masques sont stockes en uint8. Les archives sont ecrites dans un
+        fichier temporaire puis renommees ; l'empreinte des patches (prise
+        avant leur lecture) est enregistree dans ``images_packed.json``.
+        """
+        fingerprint = self._fingerprint()
+        first_img, first_msk = self._load_patch(0)
+        n = len(self.files)
+
+        # Premiere passe : bornes par canal
+        lo = first_img.min(axis=(1, 2)).astype(np.float32)
+        hi = first_img.max(axis=(1, 2)).astype(np.float32)
+        for idx in tqdm(range(1, n), desc=f"  bornes {self.root.name}", leave=False):
+            image, _ = self._load_patch(idx)
+            np.minimum(lo, image.min(axis=(1, 2)), out=lo)
+            np.maximum(hi, image.max(axis=(1, 2)), out=hi)
+
+        offset = ((hi + lo) / 2).astype(np.float32)
+        scale = np.where(hi > lo, (hi - lo) / (2 * self.QUANT_MAX), 1.0).astype(np.float32)
+        inv_scale = (1.0 / scale).reshape(-1, 1, 1)
+        offset_b = offset.reshape(-1, 1, 1)
+
+        img_path = self.root / self.IMAGES_PACK
+        meta_path = self.root / self.IMAGES_PACK_META
+        msk_path = self.root / self.MASKS_PACK
+        img_tmp = img_path.with_suffix(".npy.tmp")
+        meta_tmp = meta_path.with_suffix(".json.tmp")
+        msk_tmp = msk_path.with_suffix(".npy.tmp")
+
+        img_out = np.lib.format.open_memmap(
+            img_tmp, mode="w+", dtype=np.int16, shape=(n, *first_img.shape),
+        )
+        msk_out = np.lib.format.open_memmap(
+            msk_tmp, mode="w+", dtype=np.uint8, shape=(n, *first_msk.shape),
+        )
+        for idx in tqdm(range(n), desc=f"  pack {self.root.name}", leave=False):
+            image, mask = self._load_patch(idx)
+            image = image.astype(np.float32, copy=False)
+            image -= offset_b
+            image *= inv_scale
+            np.rint(image, out=image)
+            np.clip(image, -self.QUANT_MAX, self.QUANT_MAX, out=image)
+            img_out[idx] = image
+            msk_out[idx] = mask
+
+        img_out.flush()
+        msk_out.flush()
+        del img_out, msk_out
+        with open(meta_tmp, "w") as f:
+            json.dump({
+                "offset": offset.tolist(),
+                "scale": scale.tolist(),
+                "fingerprint": fingerprint,
+            }, f)
+        # Metadonnees renommees en dernier : une ecriture interrompue laisse
+        # une empreinte perimee, donc une archive ignoree
+        os.replace(img_tmp, img_path)
+        os.replace(msk_tmp, msk_path)
+        os.replace(meta_tmp, meta_path)
+        _log(f"Archive int16 de {n} patches ecrite dans {self.root}")
+
+    def __getitem__(self, idx: int) -> Tuple[torch.Tensor, torch.Tensor]:
+        if self.img_pack is not None:
+            image = np.array(self.img_pack[idx])   # copie (C, H, W)
+            mask = np.array(self.msk_pack[idx])    # (H, W) uint8
+            if self._qparams is not None and self.quant_params is None:
+                # Dequantification dans le worker (augmentations CPU)
+                offset, scale = self._qparams
+                image = image.astype(np.float32)
+                image *= scale
+                image += offset
+        else:
+            image, mask = self._load_patch(idx)
 
         if self.augment:
             image, mask = self._apply_augmentations(image, mask)
 
-        return torch.from_numpy(image.copy()), torch.from_numpy(mask.copy())
+        return torch.from_numpy(image), torch.from_numpy(mask)
 
     def _apply_augmentations(
         self, image: np.ndarray, mask: np.ndarray
     ) -> Tuple[np.ndarray, np.ndarray]:
-        """Appliquer les augmentations aleatoires sur le patch."""
+        """
+        Appliquer les augmentations aleatoires sur le patch.
+
+        Retournements et rotation ne produisent que des vues ; une seule copie
+        contigue est materialisee a la fin.
+        """
         # Retournement horizontal aleatoire
         if random.random() > 0.5:
-            image = np.flip(image, axis=2)
-            mask = np.flip(mask, axis=1)
+            image = image[:, :, ::-1]
+            mask = mask[:, ::-1]
 
         # Retournement vertical aleatoire
         if random.random() > 0.5:
-            image = np.flip(image, axis=1)
-            mask = np.flip(mask, axis=0)
+            image = image[:, ::-1, :]
+            mask = mask[::-1, :]
 
         # Rotation aleatoire (0, 90, 180, 270 degres)
         k = random.randint(0, 3)
@@ -138,13 +373,221 @@ class MiningPatchDataset(Dataset):
             cx = random.randint(0, w - cutout_size)
             image[:, cy:cy + cutout_size, cx:cx + cutout_size] = 0.0
 
-        return image, mask
+        return np.ascontiguousarray(image), np.ascontiguousarray(mask)
+
+
+# ---------------------------------------------------------------------------
+# Augmentations par batch sur le device
+# ---------------------------------------------------------------------------
+
+CUTOUT_SIZE = 32
+
+
+@torch.no_grad()
+def gpu_augment(
+    images: torch.Tensor,
+    masks: torch.Tensor,
+) -> Tuple[torch.Tensor, torch.Tensor]:
+    """
+    Appliquer les augmentations de ``MiningPatchDataset`` sur un batch deja transfere.
+
+    Les retournements et le cutout sont tires par echantillon, la rotation
+    (0, 90, 180, 270 degres) une fois par batch. Aucune copie cote CPU.
+
+    Args:
+        images: (B, C, H, W)
+        masks: (B, H, W)
+    """
+    b, _, h, w = images.shape
+    device = images.device
+
+    # Retournements horizontal et vertical aleatoires
+    for img_dim, msk_dim in ((-1, -1), (-2, -2)):
+        flip = torch.rand(b, device=device) > 0.5
+        images = torch.where(flip[:, None, None, None], images.flip(img_dim), images)
+        masks = torch.where(flip[:, None, None], masks.flip(msk_dim), masks)
+
+    # Rotation aleatoire commune au batch
+    k = int(torch.randint(0, 4, (1,)))
+    if k > 0:
+        images = torch.rot90(images, k, dims=(-2, -1))
+        masks = torch.rot90(masks, k, dims=(-2, -1))
+        h, w = images.shape[-2:]
+
+    # Cutout 32x32 : une region aleatoire par echantillon
+    if h > CUTOUT_SIZE and w > CUTOUT_SIZE:
+        cy = torch.randint(0, h - CUTOUT_SIZE + 1, (b, 1), device=device)
+        cx = torch.randint(0, w - CUTOUT_SIZE + 1, (b, 1), device=device)
+        rows = torch.arange(h, device=device)
+        cols = torch.arange(w, device=device)
+        in_y = (rows >= cy) & (rows < cy + CUTOUT_SIZE)      # (B, H)
+        in_x = (cols >= cx) & (cols < cx + CUTOUT_SIZE)      # (B, W)
+        box = in_y[:, :, None] & in_x[:, None, :]            # (B, H, W)
+        images = images.masked_fill(box[:, None], 0.0)
+
+    return images, masks
+
+
+# ---------------------------------------------------------------------------
+# Prechargement asynchrone vers le GPU
+# ---------------------------------------------------------------------------
+
+class _CudaPrefetcher:
+    """
+    Iterateur qui copie le batch suivant vers le GPU sur un stream dedie.
+
+    La copie hote -> device du batch ``n+1`` chevauche le calcul du batch
+    ``n`` (necessite ``pin_memory=True`` dans le DataLoader). Sur CPU, les
+    batches sont simplement deplaces sur ``device``.
+
+    Les masques sont convertis en int64 et, si le dataset rend des images
+    quantifiees (``quant_params``), celles-ci sont repassees en float32 sur
+    le device apres la copie. Les images sont rendues en ``channels_last``.
+    """
+
+    def __init__(self, loader: DataLoader, device: str) -> None:
+        self.loader = loader
+        self.device = device
+        self.stream = torch.cuda.Stream(device) if device.startswith("cuda") else None
+        quant_params = getattr(loader.dataset, "quant_params", None)
+        self.dequant = None if quant_params is None else tuple(
+            torch.from_numpy(p).to(device) for p in quant_params
+        )
+        self.next_images: torch.Tensor | None = None
+        self.next_masks: torch.Tensor | None = None
+
+    def __len__(self) -> int:
+        return len(self.loader)
+
+    def __iter__(self) -> "_CudaPrefetcher":
+        self._it = iter(self.loader)
+        self._preload()
+        return self
+
+    def _preload(self) -> None:
+        try:
+            images, masks = next(self._it)
+        except StopIteration:
+            self.next_images = self.next_masks = None
+            return
+
+        if self.stream is None:
+            self.next_images, self.next_masks = self._to_device(images, masks)
+            return
+
+        with torch.cuda.stream(self.stream):
+            self.next_images, self.next_masks = self._to_device(
+                images, masks, non_blocking=True,
+            )
+
+    def _to_device(
+        self,
+        images: torch.Tensor,
+        masks: torch.Tensor,
+        non_blocking: bool = False,
+    ) -> Tuple[torch.Tensor, torch.Tensor]:
+        images = images.to(self.device, non_blocking=non_blocking)
+        masks = masks.to(self.device, non_blocking=non_blocking).long()
+        if self.dequant is not None:
+            offset, scale = self.dequant
+            images = torch.addcmul(offset, images.float(), scale)
+        elif images.dtype != torch.float32:
+            images = images.float()
+        # Disposition NHWC du modele, convertie sur le stream de copie
+        images = images.contiguous(memory_format=torch.channels_last)
+        return images, masks
+
+    def __next__(self) -> Tuple[torch.Tensor, torch.Tensor]:
+        if self.next_images is None:
+            raise StopIteration
+
+        if self.stream is not None:
+            # Attendre la copie et rattacher les tenseurs au stream de calcul
+            current = torch.cuda.current_stream()
+            current.wait_stream(self.stream)
+            self.next_images.record_stream(current)
+            self.next_masks.record_stream(current)
+
+        images, masks = self.next_images, self.next_masks
+        self._preload()
+        return images, masks
 
 
 # ---------------------------------------------------------------------------
 # Metriques
 # ---------------------------------------------------------------------------
 
+@torch.no_grad()
+def confusion_matrix(
+    logits: torch.Tensor,
+    targets: torch.Tensor,
+    num_classes: int = 2,
+) -> torch.Tensor:
+    """
+    Matrice de confusion (verite terrain x prediction) calculee sur le device.
+
+    Voir :func:`update_confusion` : accumulation a taille fixe, sans
+    synchronisation avec l'hote.
+    """
+    confusion = torch.zeros(num_classes, num_classes, dtype=torch.long, device=logits.device)
+    update_confusion(confusion, logits, targets)
+    return confusion
+
+
+@torch.no_grad()
+def update_confusion(
+    confusion: torch.Tensor,
+    logits: torch.Tensor,
+    targets: torch.Tensor,
+) -> None:
+    """
+    Accumuler en place la matrice de confusion d'un batch.
+
+    ``index_add_`` sur ``num_classes * cible + prediction`` dans la matrice
+    aplatie : la taille de sortie est fixe, donc pas de synchronisation
+    GPU -> CPU (``torch.bincount`` lit ``input.max()`` sur l'hote sur CUDA).
+    """
+    num_classes = confusion.shape[0]
+    preds = logits.argmax(dim=1)  # (B, H, W)
+    idx = targets.reshape(-1).long() * num_classes + preds.reshape(-1)
+    confusion.view(-1).index_add_(0, idx, torch.ones_like(idx))
+
+
+def metrics_from_confusion(confusion: torch.Tensor) -> Dict[str, float]:
+    """
+    Deriver IoU, F1, precision et recall par classe d'une matrice de confusion.
+
+    Les calculs (moyennes comprises) restent vectoriels sur le device ; un
+    seul transfert vers le CPU a la fin.
+    """
+    cm = confusion.double()
+    tp = cm.diag()
+    fp = cm.sum(dim=0) - tp
+    fn = cm.sum(dim=1) - tp
+
+    precision = tp / (tp + fp + 1e-10)
+    recall = tp / (tp + fn + 1e-10)
+    f1 = 2 * precision * recall / (precision + recall + 1e-10)
+    iou = tp / (tp + fp + fn + 1e-10)
+
+    # Moyennes calculees sur le device, puis un seul .tolist() (sans NumPy)
+    num_classes = tp.numel()
+    values = torch.cat([
+        torch.stack([precision, recall, f1, iou]).flatten(),
+        torch.stack([iou.mean(), f1.mean()]),
+    ]).tolist()
+
+    metrics: Dict[str, float] = {}
+    for cls in range(num_classes):
+        metrics[f"precision_{cls}"] = values[cls]
+        metrics[f"recall_{cls}"] = values[num_classes + cls]
+        metrics[f"f1_{cls}"] = values[2 * num_classes + cls]
+        metrics[f"iou_{cls}"] = values[3 * num_classes + cls]
+
+    metrics["mean_iou"], metrics["mean_f1"] = values[-2:]
+    return metrics
+
+
 @torch.no_grad()
 def compute_metrics(
     logits: torch.Tensor,
@@ -163,73 +606,388 @@ def compute_metrics(
         Dict avec cles comme ``iou_0``, ``f1_1``, ``precision_1``, etc.
         Inclut aussi ``mean_iou`` et ``mean_f1``.
     """
-    preds = logits.argmax(dim=1)  # (B, H, W)
-    metrics: Dict[str, float] = {}
+    return metrics_from_confusion(confusion_matrix(logits, targets, num_classes))
 
-    ious, f1s = [], []
 
-    for cls in range(num_classes):
-        pred_cls = (preds == cls)
-        true_cls = (targets == cls)
+# ---------------------------------------------------------------------------
+# Reproductibilite
+# ---------------------------------------------------------------------------
 
-        tp = (pred_cls & true_cls).sum().float().item()
-        fp = (pred_cls & ~true_cls).sum().float().item()
-        fn = (~pred_cls & true_cls).sum().float().item()
+def _seed_everything(seed: int) -> None:
+    """Initialiser les generateurs ``random``, NumPy et PyTorch (CPU et CUDA)."""
+    random.seed(seed)
+    np.random.seed(seed)
+    torch.manual_seed(seed)
 
-        precision = tp / (tp + fp + 1e-10)
-        recall = tp / (tp + fn + 1e-10)
-        f1 = 2 * precision * recall / (precision + recall + 1e-10)
-        iou = tp / (tp + fp + fn + 1e-10)
 
-        metrics[f"precision_{cls}"] = precision
-        metrics[f"recall_{cls}"] = recall
-        metrics[f"f1_{cls}"] = f1
-        metrics[f"iou_{cls}"] = iou
+# ---------------------------------------------------------------------------
+# Entrainement distribue (torchrun)
+# ---------------------------------------------------------------------------
 
-        ious.append(iou)
-        f1s.append(f1)
+def _init_distributed() -> Tuple[int, int, int]:
+    """
+    Initialiser le groupe de processus si le script est lance par ``torchrun``.
 
-    metrics["mean_iou"] = float(np.mean(ious))
-    metrics["mean_f1"] = float(np.mean(f1s))
-    return metrics
+    Returns:
+        ``(rank, local_rank, world_size)`` ; ``(0, 0, 1)`` hors distribue.
+    """
+    world_size = int(os.environ.get("WORLD_SIZE", "1"))
+    if world_size <= 1:
+        return 0, 0, 1
+
+    local_rank = int(os.environ["LOCAL_RANK"])
+    if torch.cuda.is_available():
+        torch.cuda.set_device(local_rank)
+        dist.init_process_group(backend="nccl")
+    else:
+        dist.init_process_group(backend="gloo")
+    return dist.get_rank(), local_rank, world_size
+
+
+def _is_distributed() -> bool:
+    return dist.is_available() and dist.is_initialized()
+
+
+def _log(*args, **kwargs) -> None:
+    """``print`` limite au rang 0 ; les avertissements restent des ``print`` sur chaque rang."""
+    if not _is_distributed() or dist.get_rank() == 0:
+        print(*args, **kwargs)
+
+
+def _all_reduce_epoch(
+    total_loss: torch.Tensor,
+    n_batches: int,
+    confusion: torch.Tensor,
+) -> Tuple[torch.Tensor, int]:
+    """
+    Sommer perte, nombre de batches et matrice de confusion sur tous les rangs.
+
+    ``confusion`` est reduite en place ; sans groupe distribue, rien n'est fait.
+    """
+    if not _is_distributed():
+        return total_loss, n_batches
+
+    stats = torch.stack([
+        total_loss.double(),
+        torch.tensor(float(n_batches), dtype=torch.float64, device=total_loss.device),
+    ])
+    dist.all_reduce(stats)
+    dist.all_reduce(confusion)
+    return stats[0], int(stats[1].item())
+
+
+def _available_cpus() -> int:
+    """CPU utilisables par le processus (affinite / cgroup cpuset), sinon cpu_count()."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        # sched_getaffinity n'existe pas sous macOS / Windows
+        return os.cpu_count() or 4
+
+
+# ---------------------------------------------------------------------------
+# Compilation du modele
+# ---------------------------------------------------------------------------
+
+# Modes torch.compile essayes dans l'ordre avant de retomber en eager. Sur
+# GPU, les deux capturent forward/backward en CUDA Graphs (suppression du
+# cout de lancement des nombreux petits kernels de l'encodeur).
+COMPILE_MODES = ("max-autotune", "reduce-overhead")
+
+# Debut d'iteration pour les CUDA Graphs de torch.compile (None si absent)
+_cudagraph_mark_step_begin = getattr(
+    getattr(torch, "compiler", None), "cudagraph_mark_step_begin", None
+)
+
+
+def _ddp_module(model: nn.Module) -> nn.Module:
+    """Retourner le modele sous un eventuel ``torch.compile`` (DDP ou module)."""
+    return getattr(model, "_orig_mod", model)
+
+
+def _unwrap_model(model: nn.Module) -> nn.Module:
+    """Retourner le module d'origine d'un modele compile (``_orig_mod``) et/ou DDP."""
+    model = _ddp_module(model)
+    return model.module if isinstance(model, DDP) else model
+
+
+def _forward_loss(
+    model: nn.Module,
+    criterion: nn.Module,
+    images: torch.Tensor,
+    masks: torch.Tensor,
+) -> Tuple[torch.Tensor, torch.Tensor]:
+    """Forward du modele suivi de la perte ; retourne ``(logits, loss)``."""
+    logits = model(images)
+    return logits, criterion(logits, masks)
+
+
+def _warmup_step(
+    forward_loss: Callable,
+    model: nn.Module,
+    criterion: nn.Module,
+    batch: Tuple[torch.Tensor, torch.Tensor],
+    device: str,
+    amp_dtype: torch.dtype | None,
+) -> None:
+    """
+    Executer un pas de rodage pour declencher la compilation.
+
+    ``torch.compile`` est paresseux : les erreurs Dynamo/Inductor/Triton ne
+    surviennent qu'au premier appel (forward) ou a la premiere
+    retropropagation. Le rodage couvre forward + backward en mode
+    entrainement et un forward sans gradient en mode evaluation (graphe de
+    :func:`validate`). Les gradients sont remis a None et les buffers
+    (statistiques de normalisation) restaures : les poids ne bougent pas.
+    """
+    images, masks = batch
+    buffers = [b.detach().clone() for b in model.buffers()]
+    try:
+        if _cudagraph_mark_step_begin is not None:
+            _cudagraph_mark_step_begin()
+        with _autocast(device, amp_dtype):
+            _, loss = forward_loss(model, criterion, images, masks)
+        loss.backward()
+
+        model.eval()
+        if _cudagraph_mark_step_begin is not None:
+            _cudagraph_mark_step_begin()
+        with torch.no_grad(), _autocast(device, amp_dtype):
+            forward_loss(model, criterion, images, masks)
+    finally:
+        model.train()
+        model.zero_grad(set_to_none=True)
+        with torch.no_grad():
+            for buf, saved in zip(model.buffers(), buffers):
+                buf.copy_(saved)
+
+
+def _compile_forward_loss(
+    model: nn.Module,
+    criterion: nn.Module,
+    batch: Tuple[torch.Tensor, torch.Tensor],
+    device: str,
+    amp_dtype: torch.dtype | None = None,
+    mode: str | None = None,
+) -> Callable:
+    """
+    Compiler :func:`_forward_loss` (modele + perte DiceFocal) avec ``torch.compile``.
+
+    Seule cette fonction est compilee, le module restant eager : Dynamo
+    trace le modele dans le meme graphe, TorchInductor fusionne
+    softmax/log/mul de la perte avec les dernieres operations du modele, et
+    le ``mode`` choisi (CUDA Graphs compris) s'applique a tout le pas.
+
+    Essaie ``mode`` s'il est fourni (seul, repli eager en cas d'echec),
+    sinon ``max-autotune`` puis ``reduce-overhead``. Chaque mode est valide par un pas de rodage sur
+    ``batch`` (voir :func:`_warmup_step`) ; en cas d'echec le mode suivant
+    est essaye, puis la fonction eager. Le rodage paie le cout de
+    compilation (jusqu'a quelques minutes).
+    """
+    if not hasattr(torch, "compile"):
+        return _forward_loss
+
+    for candidate in (mode,) if mode else COMPILE_MODES:
+        try:
+            compiled = torch.compile(_forward_loss, mode=candidate)
+            _warmup_step(compiled, model, criterion, batch, device, amp_dtype)
+        except Exception as e:
+            print(f"Avertissement: torch.compile(mode={candidate}) en echec: {e}")
+            torch._dynamo.reset()
+            continue
+        _log(f"torch.compile actif (mode={candidate})")
+        return compiled
+
+    _log("torch.compile indisponible, execution en mode eager")
+    return _forward_loss
+
+
+def _cpu_state_dict(model: nn.Module) -> Dict[str, torch.Tensor]:
+    """Copie CPU du ``state_dict`` du module d'origine, independante de l'entrainement."""
+    return {
+        k: v.detach().to("cpu", copy=True).contiguous()
+        for k, v in _unwrap_model(model).state_dict().items()
+    }
+
+
+def _checkpoint_path(path: Path) -> Path:
+    """Chemin effectif d'un checkpoint : ``.safetensors`` si disponible."""
+    return path.with_suffix(".safetensors") if SAFETENSORS_AVAILABLE else path
+
+
+def _write_state_dict(state: Dict[str, torch.Tensor], path: Path) -> None:
+    """
+    Ecrire un ``state_dict`` CPU de maniere atomique (fichier temporaire renomme).
+
+    Format safetensors (sans pickle, chargeable par memory-map) pour un
+    chemin ``.safetensors``, ``torch.save`` sinon.
+    """
+    tmp_path = path.with_suffix(path.suffix + ".tmp")
+    if path.suffix == ".safetensors":
+        save_safetensors(state, str(tmp_path))
+    else:
+        torch.save(state, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def _save_checkpoint_async(
+    state: Dict[str, torch.Tensor],
+    path: Path,
+) -> threading.Thread:
+    """
+    Sauvegarder un ``state_dict`` CPU dans un thread d'arriere-plan.
+
+    Le fichier est ecrit dans un fichier temporaire renomme atomiquement.
+    Le thread retourne doit etre joint avant la fin.
+    """
+    thread = threading.Thread(
+        target=_write_state_dict, args=(state, path), name="checkpoint-writer"
+    )
+    thread.start()
+    return thread
+
+
+# ---------------------------------------------------------------------------
+# Precision mixte
+# ---------------------------------------------------------------------------
+
+# Types de calcul autocast selectionnables via --amp ("auto" : voir _resolve_amp)
+AMP_DTYPES: Dict[str, torch.dtype | None] = {
+    "bf16": torch.bfloat16,
+    "fp16": torch.float16,
+    "none": None,
+}
+
+
+def _resolve_amp(name: str, device: str) -> str:
+    """
+    Resoudre ``--amp auto`` : BF16 si le GPU le supporte (Ampere et plus),
+    FP16 avec GradScaler sinon, aucune precision mixte hors CUDA.
+    """
+    if name != "auto":
+        return name
+    if not device.startswith("cuda"):
+        return "none"
+    return "bf16" if torch.cuda.is_bf16_supported() else "fp16"
+
+
+def _autocast(device: str, amp_dtype: torch.dtype | None):
+    """Contexte autocast CUDA, inactif sur CPU ou si la precision mixte est desactivee."""
+    return torch.autocast(
+        device_type="cuda",
+        dtype=amp_dtype or torch.bfloat16,
+        enabled=amp_dtype is not None and device.startswith("cuda"),
+    )
 
 
 # ---------------------------------------------------------------------------
 # Boucle d'entrainement
 # ---------------------------------------------------------------------------
 
+def _progress(iterable, desc: str) -> tqdm:
+    """
+    Barre ``tqdm`` rafraichie au plus une fois par seconde (~50 mises a jour
+    par epoque), desactivee hors terminal et sur les rangs distribues non
+    principaux.
+    """
+    total = len(iterable)
+    quiet = not sys.stderr.isatty() or (_is_distributed() and dist.get_rank() != 0)
+    return tqdm(
+        iterable,
+        desc=desc,
+        total=total,
+        leave=False,
+        mininterval=1.0,
+        miniters=max(1, total // 50),
+        disable=quiet,
+    )
+
+
 def train_one_epoch(
     model: nn.Module,
     loader: DataLoader,
     criterion: nn.Module,
     optimizer: torch.optim.Optimizer,
     device: str,
+    scaler: torch.cuda.amp.GradScaler | None = None,
+    amp_dtype: torch.dtype | None = None,
+    num_classes: int = 2,
+    augment: bool = False,
+    forward_loss: Callable = _forward_loss,
+    accum_steps: int = 1,
 ) -> Tuple[float, Dict[str, float]]:
-    """Executer une epoque d'entrainement, retourner la perte moyenne et les metriques."""
+    """
+    Executer une epoque d'entrainement, retourner la perte moyenne et les metriques.
+
+    Les gradients sont accumules sur ``accum_steps`` micro-batches avant
+    chaque pas d'optimiseur (batch effectif = ``accum_steps`` x batch). Sous
+    DDP, les micro-batches intermediaires tournent sous ``no_sync()`` : un
+    seul all-reduce des gradients par pas d'optimiseur.
+
+    Le forward et la perte tournent sous autocast (``amp_dtype``). Le
+    ``scaler`` n'est utile qu'en FP16 ; en BF16 la retropropagation reste
+    directe. Les metriques sont derivees d'une matrice de confusion cumulee
+    sur toute l'epoque. Avec ``augment``, les augmentations sont appliquees
+    au batch sur le device via :func:`gpu_augment`.
+    """
     model.train()
-    total_loss = 0.0
-    all_metrics: Dict[str, float] = {}
+    total_loss = torch.zeros((), device=device)
+    confusion = torch.zeros(num_classes, num_classes, dtype=torch.long, device=device)
     n_batches = 0
+    num_batches = len(loader)
+    use_scaler = scaler is not None and scaler.is_enabled()
+
+    def _optimizer_step() -> None:
+        if use_scaler:
+            scaler.step(optimizer)
+            scaler.update()
+        else:
+            optimizer.step()
+        optimizer.zero_grad(set_to_none=True)
+
+    optimizer.zero_grad(set_to_none=True)
+    for images, masks in _progress(_CudaPrefetcher(loader, device), "  train"):
+        if augment:
+            images, masks = gpu_augment(images, masks)
+            images = images.contiguous(memory_format=torch.channels_last)
+
+        # Les sorties des CUDA Graphs de l'iteration precedente sont consommees
+        if _cudagraph_mark_step_begin is not None:
+            _cudagraph_mark_step_begin()
+
+        # Sous DDP, l'all-reduce des gradients n'a lieu qu'au micro-batch qui
+        # precede un pas d'optimiseur (dernier de l'accumulation ou de l'epoque)
+        step_now = (n_batches + 1) % accum_steps == 0 or n_batches + 1 == num_batches
+        ddp = _ddp_module(model)
+        sync = (
+            ddp.no_sync()
+            if not step_now and isinstance(ddp, DDP)
+            else contextlib.nullcontext()
+        )
+        with sync:
+            with _autocast(device, amp_dtype):
+                logits, loss = forward_loss(model, criterion, images, masks)
 
-    for images, masks in tqdm(loader, desc="  train", leave=False):
-        images = images.to(device)
-        masks = masks.to(device)
+            scaled_loss = loss / accum_steps if accum_steps > 1 else loss
+            if use_scaler:
+                scaler.scale(scaled_loss).backward()
+            else:
+                scaled_loss.backward()
 
-        optimizer.zero_grad()
-        logits = model(images)
-        loss = criterion(logits, masks)
-        loss.backward()
-        optimizer.step()
+        if (n_batches + 1) % accum_steps == 0:
+            _optimizer_step()
 
-        total_loss += loss.item()
-        batch_metrics = compute_metrics(logits, masks)
-        for k, v in batch_metrics.items():
-            all_metrics[k] = all_metrics.get(k, 0.0) + v
+        total_loss += loss.detach().float()
+        update_confusion(confusion, logits, masks)
         n_batches += 1
 
-    avg_loss = total_loss / max(n_batches, 1)
-    avg_metrics = {k: v / max(n_batches, 1) for k, v in all_metrics.items()}
-    return avg_loss, avg_metrics
+    # Micro-batches restants en fin d'epoque
+    if n_batches % accum_steps != 0:
+        _optimizer_step()
+
+    total_loss, n_batches = _all_reduce_epoch(total_loss, n_batches, confusion)
+    avg_loss = (total_loss / max(n_batches, 1)).item()
+    return avg_loss, metrics_from_confusion(confusion)
 
 
 @torch.no_grad()
@@ -238,29 +996,52 @@ def validate(
     loader: DataLoader,
     criterion: nn.Module,
     device: str,
+    amp_dtype: torch.dtype | None = None,
+    num_classes: int = 2,
+    cache: Dict[str, list] | None = None,
+    num_samples: int = 4,
+    forward_loss: Callable = _forward_loss,
 ) -> Tuple[float, Dict[str, float]]:
-    """Executer la validation, retourner la perte moyenne et les metriques."""
+    """
+    Executer la validation, retourner la perte moyenne et les metriques.
+
+    Si ``cache`` est fourni, il est rempli avec la matrice de confusion de
+    la passe (``confusion``) et les ``num_samples`` premiers echantillons
+    (``images`` pseudo-RGB, ``masks``, ``preds``) pour que les
+    visualisations n'aient pas a relancer le modele sur le jeu de validation.
+    """
     model.eval()
-    total_loss = 0.0
-    all_metrics: Dict[str, float] = {}
+    total_loss = torch.zeros((), device=device)
+    confusion = torch.zeros(num_classes, num_classes, dtype=torch.long, device=device)
     n_batches = 0
+    if cache is not None:
+        cache.clear()
+        cache.update(images=[], masks=[], preds=[])
+    n_cached = 0
+
+    for images, masks in _progress(_CudaPrefetcher(loader, device), "  val  "):
+        if _cudagraph_mark_step_begin is not None:
+            _cudagraph_mark_step_begin()
+        with _autocast(device, amp_dtype):
+            logits, loss = forward_loss(model, criterion, images, masks)
+
+        total_loss += loss.detach().float()
+        update_confusion(confusion, logits, masks)
+        n_batches += 1
 
-    for images, masks in tqdm(loader, desc="  val  ", leave=False):
-        images = images.to(device)
-        masks = masks.to(device)
-
-        logits = model(images)
-        loss = criterion(logits, masks)
+        if cache is not None and n_cached < num_samples:
+            take = num_samples - n_cached
+            cache["images"].append(images[:take, :3].float().cpu())
+            cache["masks"].append(masks[:take].cpu())
+            cache["preds"].append(logits[:take].argmax(dim=1).cpu())
+            n_cached += min(take, images.shape[0])
 
-        total_loss += loss.item()
-        batch_metrics = compute_metrics(logits, masks)
-        for k, v in batch_metrics.items():
-            all_metrics[k] = all_metrics.get(k, 0.0) + v
-        n_batches += 1
+    total_loss, n_batches = _all_reduce_epoch(total_loss, n_batches, confusion)
+    if cache is not None:
+        cache["confusion"] = [confusion.cpu()]
 
-    avg_loss = total_loss / max(n_batches, 1)
-    avg_metrics = {k: v / max(n_batches, 1) for k, v in all_metrics.items()}
-    return avg_loss, avg_metrics
+    avg_loss = (total_loss / max(n_batches, 1)).item()
+    return avg_loss, metrics_from_confusion(confusion)
 
 
 # ---------------------------------------------------------------------------
@@ -273,19 +1054,25 @@ def generate_confusion_matrix(
     device: str,
     output_path: Path,
     num_classes: int = 2,
+    cache: Dict[str, list] | None = None,
 ) -> None:
-    """Generer et sauvegarder la matrice de confusion sur le jeu de validation."""
-    model.eval()
-    confusion = np.zeros((num_classes, num_classes), dtype=np.int64)
+    """
+    Generer et sauvegarder la matrice de confusion sur le jeu de validation.
+
+    Reutilise la matrice du ``cache`` rempli par :func:`validate` si elle
+    est disponible, sinon relance le modele sur ``loader``.
+    """
+    if cache and cache.get("confusion"):
+        confusion = cache["confusion"][0].numpy().astype(np.int64)
+    else:
+        model.eval()
+        counts = torch.zeros(num_classes, num_classes, dtype=torch.long, device=device)
 
-    with torch.no_grad():
-        for images, masks in loader:
-            images = images.to(device)
-            preds = model(images).argmax(dim=1).cpu().numpy()
-            targets = masks.numpy()
+        with torch.no_grad():
+            for images, masks in _CudaPrefetcher(loader, device):
+                update_confusion(counts, model(images), masks)
 
-            for t, p in zip(targets.ravel(), preds.ravel()):
-                confusion[t, p] += 1
+        confusion = counts.cpu().numpy()
 
     # Normalisation par ligne pour les pourcentages
     row_sums = confusion.sum(axis=1, keepdims=True)
@@ -314,7 +1101,20 @@ def generate_confusion_matrix(
     fig.tight_layout()
     fig.savefig(output_path, dpi=150)
     plt.close(fig)
-    print(f"Matrice de confusion sauvegardee: {output_path}")
+    _log(f"Matrice de confusion sauvegardee: {output_path}")
+
+
+def _pseudo_rgb(images: torch.Tensor) -> np.ndarray:
+    """
+    Normaliser les 3 premieres bandes en pseudo-RGB [0, 1] pour tout le batch.
+
+    Min/max par echantillon calcules sur le device, un seul transfert.
+    Retourne un tableau (B, H, W, 3).
+    """
+    rgb = images[:, :3].float()
+    mn = rgb.amin(dim=(2, 3), keepdim=True)
+    mx = rgb.amax(dim=(2, 3), keepdim=True)
+    return ((rgb - mn) / (mx - mn + 1e-10)).permute(0, 2, 3, 1).cpu().numpy()
 
 
 def generate_sample_predictions(
@@ -323,30 +1123,45 @@ def generate_sample_predictions(
     device: str,
     output_path: Path,
     num_samples: int = 4,
+    cache: Dict[str, list] | None = None,
 ) -> None:
-    """Generer et sauvegarder des exemples de predictions visuelles."""
-    model.eval()
+    """
+    Generer et sauvegarder des exemples de predictions visuelles.
+
+    Utilise les echantillons du ``cache`` rempli par :func:`validate` s'ils
+    sont disponibles, sinon relance le modele sur ``loader``.
+    """
     images_list, masks_list, preds_list = [], [], []
 
-    with torch.no_grad():
-        for images, masks in loader:
-            images = images.to(device)
-            logits = model(images)
-            probs = F.softmax(logits, dim=1)[:, 1].cpu().numpy()
-            preds = logits.argmax(dim=1).cpu().numpy()
+    if cache and cache.get("images"):
+        images = torch.cat(cache["images"])[:num_samples]
+        masks = torch.cat(cache["masks"])[:num_samples]
+        preds = torch.cat(cache["preds"])[:num_samples]
+        rgb = _pseudo_rgb(images)
+        for i in range(images.shape[0]):
+            images_list.append(rgb[i])
+            masks_list.append(masks[i].numpy())
+            preds_list.append(preds[i].numpy())
+    else:
+        model.eval()
+        with torch.no_grad():
+            for images, masks in _CudaPrefetcher(loader, device):
+                logits = model(images)
+                probs = F.softmax(logits, dim=1)[:, 1].cpu().numpy()
+                preds = logits.argmax(dim=1).cpu().numpy()
+                masks_np = masks.cpu().numpy()
+                # Utiliser les 3 premieres bandes comme pseudo-RGB
+                rgb = _pseudo_rgb(images)
+
+                for i in range(images.shape[0]):
+                    if len(images_list) >= num_samples:
+                        break
+                    images_list.append(rgb[i])
+                    masks_list.append(masks_np[i])
+                    preds_list.append(preds[i])
 
-            for i in range(images.shape[0]):
                 if len(images_list) >= num_samples:
                     break
-                # Utiliser les 3 premieres bandes comme pseudo-RGB
-                rgb = images[i, :3].cpu().numpy().transpose(1, 2, 0)
-                rgb = (rgb - rgb.min()) / (rgb.max() - rgb.min() + 1e-10)
-                images_list.append(rgb)
-                masks_list.append(masks[i].numpy())
-                preds_list.append(preds[i])
-
-            if len(images_list) >= num_samples:
-                break
 
     n = len(images_list)
     if n == 0:
@@ -373,7 +1188,7 @@ def generate_sample_predictions(
     fig.tight_layout()
     fig.savefig(output_path, dpi=150)
     plt.close(fig)
-    print(f"Exemples de predictions sauvegardes: {output_path}")
+    _log(f"Exemples de predictions sauvegardes: {output_path}")
 
 
 # ---------------------------------------------------------------------------
@@ -394,85 +1209,197 @@ def main() -> None:
                         help="Peripherique (defaut: detection automatique)")
     parser.add_argument("--patience", type=int, default=5,
                         help="Patience pour l'arret premature (epoques)")
-    parser.add_argument("--num-workers", type=int, default=4)
+    parser.add_argument("--num-workers", type=int, default=None,
+                        help="Workers DataLoader par rang "
+                             "(defaut: CPU disponibles / rangs locaux, max 16)")
+    parser.add_argument("--accum-steps", type=int, default=1,
+                        help="Micro-batches accumules par pas d'optimiseur")
+    parser.add_argument("--seed", type=int, default=42,
+                        help="Graine des generateurs aleatoires")
+    parser.add_argument("--prepack", action="store_true",
+                        help="Regrouper les patches en archives memory-map avant l'entrainement")
+    parser.add_argument("--cpu-augment", action="store_true",
+                        help="Augmenter dans les workers du DataLoader plutot que sur le device")
+    parser.add_argument("--amp", choices=["auto", *sorted(AMP_DTYPES)], default="auto",
+                        help="Precision mixte sur CUDA (defaut: bf16 si supporte, sinon fp16)")
+    parser.add_argument("--compile-mode", choices=COMPILE_MODES, default=None,
+                        help="Mode torch.compile impose, repli eager s'il echoue au rodage "
+                             "(defaut: max-autotune puis reduce-overhead)")
+    parser.add_argument("--no-compile", action="store_true",
+                        help="Desactiver torch.compile (execution eager)")
 
     args = parser.parse_args()
 
-    device = args.device or ("cuda" if torch.cuda.is_available() else "cpu")
-    print(f"Peripherique: {device}")
+    # ---- Distribution (torchrun) : un processus par GPU ---------------------
+    rank, local_rank, world_size = _init_distributed()
+    distributed = world_size > 1
+    is_main = rank == 0
+    # Seul le rang 0 affiche (_log), journalise et sauvegarde
+    use_mlflow = MLFLOW_AVAILABLE and is_main
+
+    if distributed and torch.cuda.is_available():
+        device = f"cuda:{local_rank}"
+    else:
+        device = args.device or ("cuda" if torch.cuda.is_available() else "cpu")
+    _log(f"Peripherique: {device} (processus: {world_size})")
+    # Graine decalee par rang : augmentations differentes sur chaque GPU
+    # (les poids initiaux sont diffuses depuis le rang 0 par DDP)
+    _seed_everything(args.seed + rank)
+
+    # Patches de taille fixe : l'autotuning cuDNN est amorti des le premier
+    # batch ; TF32 pour les matmuls/convolutions restees en FP32
+    torch.backends.cudnn.benchmark = True
+    torch.backends.cuda.matmul.allow_tf32 = True
+    torch.backends.cudnn.allow_tf32 = True
+    torch.set_float32_matmul_precision("high")
+
+    amp_name = _resolve_amp(args.amp, device)
+    _log(f"Precision mixte: {amp_name}")
 
     data_root = Path(args.data_dir)
     output_dir = Path(args.output_dir)
     output_dir.mkdir(parents=True, exist_ok=True)
 
     # ---- Integration MLflow ------------------------------------------------
-    if MLFLOW_AVAILABLE:
+    if use_mlflow:
         mlflow.set_experiment("MineSpot-CI")
         mlflow.start_run()
         mlflow.log_params({
             "epochs": args.epochs,
             "batch_size": args.batch_size,
+            "accum_steps": args.accum_steps,
             "lr": args.lr,
             "weight_decay": args.weight_decay,
             "patience": args.patience,
+            "seed": args.seed,
             "device": device,
+            "world_size": world_size,
             "loss": "DiceFocalLoss",
             "model": "MineSpotSegFormer-B4",
             "augmentations": "flip_h,flip_v,rot90,cutout32",
+            "compile": "none" if args.no_compile else (args.compile_mode or "auto"),
+            "amp": amp_name,
+            "augment_on": "cpu" if args.cpu_augment else "device",
         })
-        print("MLflow: experience 'MineSpot-CI' initialisee")
+        _log("MLflow: experience 'MineSpot-CI' initialisee")
     else:
-        print("MLflow non disponible, entrainement sans tracking")
+        _log("MLflow non disponible, entrainement sans tracking")
 
     # ---- Jeux de donnees et chargeurs --------------------------------------
-    train_ds = MiningPatchDataset(data_root / "train", augment=True)
-    val_ds = MiningPatchDataset(data_root / "val", augment=False)
+    # Le rang 0 construit les archives (--prepack) avant que les autres ne
+    # les ouvrent
+    if distributed and not is_main:
+        dist.barrier()
+    train_ds = MiningPatchDataset(
+        data_root / "train", augment=args.cpu_augment, pack=args.prepack and is_main,
+    )
+    val_ds = MiningPatchDataset(data_root / "val", augment=False, pack=args.prepack and is_main)
+    if distributed and is_main:
+        dist.barrier()
+
+    _log(f"Echantillons d'entrainement : {len(train_ds)}")
+    _log(f"Echantillons de validation  : {len(val_ds)}")
+
+    # Workers conserves entre les epoques et file de prechargement plus profonde
+    # (prefetch_factor n'est accepte qu'avec des workers). La memoire epinglee
+    # ne sert qu'aux copies asynchrones (non_blocking) vers un GPU.
+    num_workers = args.num_workers
+    if num_workers is None:
+        local_ranks = int(os.environ.get("LOCAL_WORLD_SIZE", "1"))
+        num_workers = min(max(1, _available_cpus() // local_ranks), 16)
+    _log(f"Workers DataLoader          : {num_workers}")
+    loader_kwargs = dict(
+        batch_size=args.batch_size,
+        num_workers=num_workers,
+        pin_memory=device.startswith("cuda"),
+    )
+    if num_workers > 0:
+        loader_kwargs.update(persistent_workers=True, prefetch_factor=4)
 
-    print(f"Echantillons d'entrainement : {len(train_ds)}")
-    print(f"Echantillons de validation  : {len(val_ds)}")
+    # En distribue, chaque rang voit une partition disjointe des donnees
+    train_sampler = (
+        DistributedSampler(train_ds, shuffle=True, seed=args.seed) if distributed else None
+    )
+    val_sampler = DistributedSampler(val_ds, shuffle=False) if distributed else None
 
     train_loader = DataLoader(
-        train_ds, batch_size=args.batch_size, shuffle=True,
-        num_workers=args.num_workers, pin_memory=True, drop_last=True,
-    )
-    val_loader = DataLoader(
-        val_ds, batch_size=args.batch_size, shuffle=False,
-        num_workers=args.num_workers, pin_memory=True,
+        train_ds, shuffle=train_sampler is None, sampler=train_sampler,
+        drop_last=True, **loader_kwargs,
     )
+    val_loader = DataLoader(val_ds, shuffle=False, sampler=val_sampler, **loader_kwargs)
 
     # ---- Modele, perte, optimiseur, scheduler ------------------------------
     model = MineSpotSegFormer(
         in_channels=MineSpotSegFormer.NUM_CHANNELS,
         num_classes=MineSpotSegFormer.NUM_CLASSES,
     ).to(device)
+    # Disposition NHWC : noyaux tensor-core cuDNN sans transposition implicite
+    model = model.to(memory_format=torch.channels_last)
 
     total_params = sum(p.numel() for p in model.parameters())
     trainable_params = sum(p.numel() for p in model.parameters() if p.requires_grad)
-    print(f"Parametres du modele: {total_params:,} total, {trainable_params:,} entrainables")
+    _log(f"Parametres du modele: {total_params:,} total, {trainable_params:,} entrainables")
+
+    # AllReduce des gradients par buckets, recouvert par la retropropagation
+    if distributed:
+        model = DDP(
+            model,
+            device_ids=[local_rank] if device.startswith("cuda") else None,
+            bucket_cap_mb=25,
+            gradient_as_bucket_view=True,
+        )
 
     criterion = DiceFocalLoss(dice_weight=0.5, gamma=2.0, alpha=0.5)
     optimizer = AdamW(model.parameters(), lr=args.lr, weight_decay=args.weight_decay)
     scheduler = CosineAnnealingWarmRestarts(optimizer, T_0=10, T_mult=2, eta_min=1e-6)
 
+    # Precision mixte : le GradScaler n'est actif qu'en FP16 sur CUDA
+    amp_dtype = AMP_DTYPES[amp_name]
+    scaler = torch.cuda.amp.GradScaler(
+        enabled=amp_dtype is torch.float16 and device.startswith("cuda"),
+    )
+
+    # Compilation validee par un pas de rodage sur un batch reel (repli eager)
+    forward_loss = _forward_loss
+    if not args.no_compile:
+        warmup_batch = next(iter(_CudaPrefetcher(train_loader, device)))
+        forward_loss = _compile_forward_loss(
+            model, criterion, warmup_batch, device, amp_dtype, args.compile_mode,
+        )
+        del warmup_batch
+
     # ---- Boucle d'entrainement ---------------------------------------------
     best_val_f1 = 0.0
     patience_counter = 0
+    # Confusion et echantillons de la derniere validation (modele final)
+    val_cache: Dict[str, list] = {}
+    # Ecriture en arriere-plan du meilleur checkpoint, poids gardes en memoire
+    # pour un unique enregistrement MLflow en fin d'entrainement
+    pending_save: threading.Thread | None = None
+    best_state: Dict[str, torch.Tensor] | None = None
     history: Dict[str, List[float]] = {
         "train_loss": [], "val_loss": [],
         "train_f1": [], "val_f1": [],
         "train_iou": [], "val_iou": [],
     }
 
-    print(f"\nDemarrage de l'entrainement pour {args.epochs} epoques...")
-    print("-" * 80)
+    _log(f"\nDemarrage de l'entrainement pour {args.epochs} epoques...")
+    _log("-" * 80)
 
     for epoch in range(1, args.epochs + 1):
         t0 = time.time()
+        if train_sampler is not None:
+            train_sampler.set_epoch(epoch)
 
         train_loss, train_metrics = train_one_epoch(
             model, train_loader, criterion, optimizer, device,
+            scaler=scaler, amp_dtype=amp_dtype, augment=not args.cpu_augment,
+            forward_loss=forward_loss, accum_steps=args.accum_steps,
+        )
+        val_loss, val_metrics = validate(
+            model, val_loader, criterion, device, amp_dtype=amp_dtype, cache=val_cache,
+            forward_loss=forward_loss,
         )
-        val_loss, val_metrics = validate(model, val_loader, criterion, device)
 
         scheduler.step()
 
@@ -491,7 +1418,7 @@ def main() -> None:
         history["val_iou"].append(val_iou)
 
         # Logger les metriques dans MLflow
-        if MLFLOW_AVAILABLE:
+        if use_mlflow:
             mlflow.log_metrics({
                 "train_loss": train_loss,
                 "val_loss": val_loss,
@@ -506,7 +1433,7 @@ def main() -> None:
                 "lr": optimizer.param_groups[0]["lr"],
             }, step=epoch)
 
-        print(
+        _log(
             f"Epoque {epoch:3d}/{args.epochs} | "
             f"train_loss={train_loss:.4f}  val_loss={val_loss:.4f} | "
             f"train_f1={train_f1:.4f}  val_f1={val_f1:.4f} | "
@@ -516,56 +1443,74 @@ def main() -> None:
         )
 
         # -- Sauvegarde du meilleur modele (base sur val_f1) --
+        # val_f1 est identique sur tous les rangs (metriques reduites), donc
+        # la decision d'arret premature aussi
         if val_f1 > best_val_f1:
             best_val_f1 = val_f1
             patience_counter = 0
-            best_path = output_dir / "best_f1.pth"
-            torch.save(model.state_dict(), best_path)
-            print(f"  -> Nouveau meilleur modele sauvegarde (val_f1={val_f1:.4f})")
-
-            # Enregistrer le modele dans MLflow Model Registry
-            if MLFLOW_AVAILABLE:
-                mlflow.pytorch.log_model(
-                    model,
-                    artifact_path="model",
-                    registered_model_name="MineSpotSegFormer",
-                )
+            if is_main:
+                best_path = _checkpoint_path(output_dir / "best_f1.pth")
+                best_state = _cpu_state_dict(model)
+                if pending_save is not None:
+                    pending_save.join()
+                pending_save = _save_checkpoint_async(best_state, best_path)
+                _log(f"  -> Nouveau meilleur modele sauvegarde (val_f1={val_f1:.4f})")
+
+            if use_mlflow:
                 mlflow.log_metric("best_val_f1", best_val_f1, step=epoch)
         else:
             patience_counter += 1
 
         # -- Arret premature --
         if patience_counter >= args.patience:
-            print(f"\nArret premature apres {epoch} epoques (pas d'amelioration depuis "
+            _log(f"\nArret premature apres {epoch} epoques (pas d'amelioration depuis "
                   f"{args.patience} epoques).")
             break
 
+    if distributed:
+        dist.destroy_process_group()
+    if not is_main:
+        return
+
     # ---- Sauvegarder le modele final ---------------------------------------
-    final_path = output_dir / "minespot_segformer_final.pt"
-    torch.save(model.state_dict(), final_path)
-    print(f"\nModele final sauvegarde: {final_path}")
-    print(f"Meilleur F1 de validation: {best_val_f1:.4f}")
+    if pending_save is not None:
+        pending_save.join()
+    final_path = _checkpoint_path(output_dir / "minespot_segformer_final.pt")
+    _write_state_dict(_cpu_state_dict(model), final_path)
+    _log(f"\nModele final sauvegarde: {final_path}")
+    _log(f"Meilleur F1 de validation: {best_val_f1:.4f}")
 
     # ---- Generation des visualisations -------------------------------------
-    print("\nGeneration des visualisations...")
+    _log("\nGeneration des visualisations...")
 
     # Matrice de confusion
     cm_path = output_dir / "confusion_matrix.png"
-    generate_confusion_matrix(model, val_loader, device, cm_path)
+    generate_confusion_matrix(model, val_loader, device, cm_path, cache=val_cache)
 
     # Exemples de predictions
     sp_path = output_dir / "sample_predictions.png"
-    generate_sample_predictions(model, val_loader, device, sp_path)
+    generate_sample_predictions(model, val_loader, device, sp_path, cache=val_cache)
 
     # Logger les artefacts dans MLflow
-    if MLFLOW_AVAILABLE:
+    if use_mlflow:
         if cm_path.exists():
             mlflow.log_artifact(str(cm_path))
         if sp_path.exists():
             mlflow.log_artifact(str(sp_path))
 
+    # ---- Enregistrer le meilleur modele dans MLflow Model Registry ---------
+    # Un seul envoi, apres les visualisations (qui portent sur le modele final)
+    if use_mlflow and best_state is not None:
+        best_model = _unwrap_model(model)
+        best_model.load_state_dict(best_state)
+        mlflow.pytorch.log_model(
+            best_model,
+            artifact_path="model",
+            registered_model_name="MineSpotSegFormer",
+        )
+
     # ---- Transition vers Production si meilleur que le modele actuel -------
-    if MLFLOW_AVAILABLE:
+    if use_mlflow:
         try:
             client = MlflowClient()
             model_name = "MineSpotSegFormer"
@@ -595,21 +1540,21 @@ def main() -> None:
                         stage="Production",
                         archive_existing_versions=True,
                     )
-                    print(
+                    _log(
                         f"Modele v{new_version} transite en Production "
                         f"(F1={best_val_f1:.4f} > {current_prod_f1:.4f})"
                     )
             else:
-                print(
+                _log(
                     f"Modele non promu en Production "
                     f"(F1={best_val_f1:.4f} <= Production F1={current_prod_f1:.4f})"
                 )
         except Exception as e:
-            print(f"Avertissement: echec de la transition MLflow: {e}")
+            _log(f"Avertissement: echec de la transition MLflow: {e}")
 
         mlflow.end_run()
 
-    print("Entrainement termine.")
+    _log("Entrainement termine.")
 
 
 if __name__ == "__main__":
@@ -20,6 +20,9 @@ Auteur : Ge O'Miner / MineSpot AI
 from __future__ import annotations
 
 import argparse
+import csv
+import hashlib
+import io
 import json
 import logging
 import os
@@ -57,6 +60,19 @@ DEFAULT_RESOLUTION = 7
 OUTPUT_DIR = PROJECT_ROOT / "scripts" / "data"
 OUTPUT_GEOJSON = OUTPUT_DIR / "h3_grid_ci.geojson"
 
+# Cache des geometries H3 (centres et contours) entre executions
+CACHE_DIR = OUTPUT_DIR / "_cache"
+
+# Zones auriferes principales de Cote d'Ivoire (lat, lon, rayon_km, poids)
+GOLD_ZONES = np.array([
+    (7.80, -7.00, 50, 0.9),   # Ity (Man) - plus grande mine d'or
+    (9.26, -5.69, 40, 0.85),  # Tongon (Korhogo)
+    (5.80, -5.50, 30, 0.75),  # Agbaou (Divo)
+    (6.60, -5.60, 25, 0.70),  # Bonikro (Yamoussoukro)
+    (6.20, -6.30, 30, 0.65),  # Sissingue (Daloa)
+    (7.50, -6.50, 35, 0.60),  # Abujar (Seguela)
+], dtype=np.float64)
+
 # URL base de donnees
 DEFAULT_DB_URL = os.getenv(
     "DATABASE_URL",
@@ -152,57 +168,154 @@ def _fallback_risk_scores(h3_indices: list[str]) -> dict[str, float]:
     Calculer des scores de risque heuristiques bases sur la position
     geographique lorsque le modele XGBoost n'est pas disponible.
 
-    Les zones auriferes connues de la CI ont un score plus eleve.
+    Les zones auriferes connues de la CI ont un score plus eleve. Seules les
+    cellules d'un ``h3.grid_disk`` autour de chaque zone (rayon converti en
+    anneaux H3) sont evaluees ; les autres ont une influence nulle.
     """
-    # Zones auriferes principales de Cote d'Ivoire (lat, lon, rayon_km, poids)
-    gold_zones = [
-        (7.80, -7.00, 50, 0.9),   # Ity (Man) - plus grande mine d'or
-        (9.26, -5.69, 40, 0.85),  # Tongon (Korhogo)
-        (5.80, -5.50, 30, 0.75),  # Agbaou (Divo)
-        (6.60, -5.60, 25, 0.70),  # Bonikro (Yamoussoukro)
-        (6.20, -6.30, 30, 0.65),  # Sissingue (Daloa)
-        (7.50, -6.50, 35, 0.60),  # Abujar (Seguela)
-    ]
+    if not h3_indices:
+        return {}
+
+    position = {h3_idx: i for i, h3_idx in enumerate(h3_indices)}
+    resolution = h3.get_resolution(h3_indices[0])
+    edge_km = h3.average_hexagon_edge_length(resolution, unit="km")
+
+    # Score base sur la proximite des zones auriferes
+    max_influence = np.zeros(len(h3_indices), dtype=np.float64)
+    for zone_lat, zone_lon, rayon_km, poids in GOLD_ZONES:
+        center = h3.latlng_to_cell(zone_lat, zone_lon, resolution)
+        # Anneaux espaces d'au moins 1.5 arete : k couvre largement le rayon
+        k = int(np.ceil(rayon_km / edge_km)) + 1
+        rows = np.fromiter(
+            (position[c] for c in h3.grid_disk(center, k) if c in position),
+            dtype=np.intp,
+        )
+        if rows.size == 0:
+            continue
+
+        latlng = _cell_centers([h3_indices[i] for i in rows])
+        lat, lng = latlng[:, 0], latlng[:, 1]
+        distance_km = np.hypot(
+            (lat - zone_lat) * 110.54,
+            (lng - zone_lon) * 111.32 * np.cos(np.radians(lat)),
+        )
+        influence = poids * np.maximum(0.0, 1.0 - distance_km / rayon_km)
+        np.maximum.at(max_influence, rows, influence)
 
-    scores = {}
-    for h3_idx in h3_indices:
-        lat, lng = h3.cell_to_latlng(h3_idx)
+    # Ajouter un bruit deterministe base sur l'index H3
+    noise = _cell_noise(h3_indices, sigma=0.05)
+
+    risk = np.clip(max_influence + noise + 0.1, 0, 1).round(4)
+    return dict(zip(h3_indices, risk.tolist()))
 
-        # Score base sur la proximite des zones auriferes
-        max_influence = 0.0
-        for zone_lat, zone_lon, rayon_km, poids in gold_zones:
-            distance_km = np.sqrt(
-                ((lat - zone_lat) * 110.54) ** 2
-                + ((lng - zone_lon) * 111.32 * np.cos(np.radians(lat))) ** 2
-            )
-            if distance_km < rayon_km:
-                influence = poids * (1.0 - distance_km / rayon_km)
-                max_influence = max(max_influence, influence)
 
-        # Ajouter un bruit deterministe base sur le hash H3
-        seed = abs(hash(h3_idx)) % (2**31)
-        rng = np.random.RandomState(seed)
-        noise = rng.normal(0, 0.05)
+def _cell_centers(h3_indices: list[str]) -> np.ndarray:
+    """Centres (lat, lng) des hexagones, tableau float64 de forme (N, 2)."""
+    return np.array(
+        [h3.cell_to_latlng(h3_idx) for h3_idx in h3_indices],
+        dtype=np.float64,
+    ).reshape(-1, 2)
 
-        risk = np.clip(max_influence + noise + 0.1, 0, 1)
-        scores[h3_idx] = round(float(risk), 4)
 
-    return scores
+def _splitmix64(x: np.ndarray) -> np.ndarray:
+    """Melangeur splitmix64 vectorise (arithmetique uint64 modulo 2**64)."""
+    x = x + np.uint64(0x9E3779B97F4A7C15)
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+def _cell_noise(h3_indices: list[str], sigma: float) -> np.ndarray:
+    """
+    Bruit gaussien N(0, sigma) deterministe par hexagone.
+
+    Deux uniformes sont derivees de l'index H3 entier par splitmix64 puis
+    combinees par Box-Muller : meme bruit pour une cellule donnee d'une
+    execution a l'autre (contrairement a ``hash()``, randomise par processus).
+    """
+    cells = np.fromiter(
+        (h3.str_to_int(h3_idx) for h3_idx in h3_indices),
+        dtype=np.uint64,
+        count=len(h3_indices),
+    )
+    bits1 = _splitmix64(cells)
+    bits2 = _splitmix64(bits1)
+    # 53 bits de poids fort -> uniformes dans ]0, 1[
+    u1 = ((bits1 >> np.uint64(11)).astype(np.float64) + 0.5) * 2.0**-53
+    u2 = ((bits2 >> np.uint64(11)).astype(np.float64) + 0.5) * 2.0**-53
+    return sigma * np.sqrt(-2.0 * np.log(u1)) * np.cos(2.0 * np.pi * u2)
 
 
 # ---------------------------------------------------------------------------
 # Conversion en GeoJSON
 # ---------------------------------------------------------------------------
 
-def h3_to_geojson_polygon(h3_index: str) -> dict:
-    """Convertir un index H3 en geometrie GeoJSON Polygon."""
-    boundary = h3.cell_to_boundary(h3_index)
-    coords = [[lng, lat] for lat, lng in boundary]
-    coords.append(coords[0])
-    return {
-        "type": "Polygon",
-        "coordinates": [coords],
-    }
+# Seuils des niveaux de risque et libelles associes (np.digitize)
+RISK_LEVEL_THRESHOLDS = np.array([0.2, 0.4, 0.6, 0.8])
+RISK_LEVELS = ("MINIMAL", "FAIBLE", "MOYEN", "ELEVE", "CRITIQUE")
+
+
+def _cell_geometry(
+    h3_indices: list[str],
+    resolution: int,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Centres et contours des hexagones, memorises dans ``CACHE_DIR``.
+
+    La cle du cache combine la resolution et un hash SHA-1 des index tries :
+    tout changement de grille (bbox, resolution) invalide l'entree.
+
+    Retourne
+    --------
+    centers : np.ndarray
+        Centres (lat, lng), forme (N, 2).
+    boundaries : np.ndarray
+        Sommets (lat, lng), forme (N, V, 2), completes par NaN. V vaut 6 en
+        general, davantage pour les cellules distordues (jusqu'a 10).
+    n_vertices : np.ndarray
+        Nombre de sommets reels de chaque contour.
+    """
+    cells = np.array(h3_indices)
+    order = np.argsort(cells, kind="stable")
+    digest = hashlib.sha1("\n".join(cells[order]).encode()).hexdigest()
+    cache_path = CACHE_DIR / f"h3_geometry_r{resolution}_{digest}.npz"
+
+    if cache_path.exists():
+        with np.load(cache_path) as cached:
+            sorted_centers = cached["centers"]
+            sorted_boundaries = cached["boundaries"]
+            sorted_counts = cached["n_vertices"]
+        logger.info(f"Geometries H3 chargees depuis le cache {cache_path}")
+    else:
+        sorted_cells = cells[order].tolist()
+        sorted_centers = _cell_centers(sorted_cells)
+        contours = [h3.cell_to_boundary(h3_idx) for h3_idx in sorted_cells]
+        sorted_counts = np.fromiter(
+            (len(c) for c in contours), dtype=np.int8, count=len(contours),
+        )
+        width = int(sorted_counts.max(initial=0))
+        sorted_boundaries = np.full((len(contours), width, 2), np.nan)
+        for i, contour in enumerate(contours):
+            sorted_boundaries[i, :len(contour)] = contour
+
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        tmp_path = cache_path.with_suffix(".tmp.npz")
+        np.savez_compressed(
+            tmp_path,
+            centers=sorted_centers,
+            boundaries=sorted_boundaries,
+            n_vertices=sorted_counts,
+        )
+        os.replace(tmp_path, cache_path)
+        logger.info(f"Geometries H3 mises en cache : {cache_path}")
+
+    # Retour a l'ordre des index fournis
+    centers = np.empty_like(sorted_centers)
+    boundaries = np.empty_like(sorted_boundaries)
+    n_vertices = np.empty_like(sorted_counts)
+    centers[order] = sorted_centers
+    boundaries[order] = sorted_boundaries
+    n_vertices[order] = sorted_counts
+    return centers, boundaries, n_vertices
 
 
 def build_geojson(
@@ -227,59 +340,62 @@ def build_geojson(
     geojson : dict
         FeatureCollection GeoJSON conforme RFC 7946.
     """
-    features = []
-    for h3_idx in h3_indices:
-        lat, lng = h3.cell_to_latlng(h3_idx)
-        score = risk_scores.get(h3_idx, 0.0)
-
-        # Determiner le niveau de risque
-        if score >= 0.8:
-            risk_level = "CRITIQUE"
-        elif score >= 0.6:
-            risk_level = "ELEVE"
-        elif score >= 0.4:
-            risk_level = "MOYEN"
-        elif score >= 0.2:
-            risk_level = "FAIBLE"
-        else:
-            risk_level = "MINIMAL"
-
-        feature = {
+    scores = np.array(
+        [risk_scores.get(h3_idx, 0.0) for h3_idx in h3_indices], dtype=np.float64,
+    )
+    # Niveau de risque par seuils [0.2, 0.4, 0.6, 0.8[ en une passe
+    level_idx = np.digitize(scores, RISK_LEVEL_THRESHOLDS).tolist()
+    centers, boundaries, n_vertices = _cell_geometry(h3_indices, resolution)
+    centers = centers.tolist()
+    # Contours en (lng, lat) ; le padding NaN est ecarte par n_vertices
+    rings = boundaries[:, :, ::-1].tolist()
+    n_vertices = n_vertices.tolist()
+    score_list = scores.tolist()
+
+    # Trier par score decroissant (tri stable, comme list.sort)
+    order = np.argsort(-scores, kind="stable").tolist()
+    features = [
+        {
             "type": "Feature",
-            "geometry": h3_to_geojson_polygon(h3_idx),
+            "geometry": {
+                "type": "Polygon",
+                "coordinates": [
+                    rings[i][:n_vertices[i]] + [rings[i][0]],
+                ],
+            },
             "properties": {
-                "h3_index": h3_idx,
+                "h3_index": h3_indices[i],
                 "resolution": resolution,
-                "risk_score": score,
-                "risk_level": risk_level,
-                "center_lat": round(lat, 6),
-                "center_lng": round(lng, 6),
+                "risk_score": score_list[i],
+                "risk_level": RISK_LEVELS[level_idx[i]],
+                "center_lat": round(centers[i][0], 6),
+                "center_lng": round(centers[i][1], 6),
             },
         }
-        features.append(feature)
-
-    # Trier par score decroissant
-    features.sort(
-        key=lambda f: f["properties"]["risk_score"], reverse=True
-    )
+        for i in order
+    ]
 
     # Statistiques
-    all_scores = list(risk_scores.values())
+    all_scores = np.fromiter(risk_scores.values(), dtype=np.float64, count=len(risk_scores))
+    level_counts = np.bincount(
+        np.digitize(all_scores, RISK_LEVEL_THRESHOLDS), minlength=len(RISK_LEVELS),
+    ).tolist()
+    has_scores = all_scores.size > 0
     metadata = {
         "generated_at": datetime.now(timezone.utc).isoformat(),
         "resolution": resolution,
         "total_hexagons": len(features),
         "bbox": CI_BBOX,
         "stats": {
-            "mean_risk": round(float(np.mean(all_scores)), 4) if all_scores else 0,
-            "max_risk": round(float(np.max(all_scores)), 4) if all_scores else 0,
-            "min_risk": round(float(np.min(all_scores)), 4) if all_scores else 0,
-            "std_risk": round(float(np.std(all_scores)), 4) if all_scores else 0,
-            "critical_count": sum(1 for s in all_scores if s >= 0.8),
-            "high_count": sum(1 for s in all_scores if 0.6 <= s < 0.8),
-            "medium_count": sum(1 for s in all_scores if 0.4 <= s < 0.6),
-            "low_count": sum(1 for s in all_scores if 0.2 <= s < 0.4),
-            "minimal_count": sum(1 for s in all_scores if s < 0.2),
+            "mean_risk": round(float(all_scores.mean()), 4) if has_scores else 0,
+            "max_risk": round(float(all_scores.max()), 4) if has_scores else 0,
+            "min_risk": round(float(all_scores.min()), 4) if has_scores else 0,
+            "std_risk": round(float(all_scores.std()), 4) if has_scores else 0,
+            "critical_count": level_counts[4],
+            "high_count": level_counts[3],
+            "medium_count": level_counts[2],
+            "low_count": level_counts[1],
+            "minimal_count": level_counts[0],
         },
     }
 
@@ -339,49 +455,31 @@ def insert_into_database(
         cursor = conn.cursor()
 
         # Preparer les donnees pour l'upsert batch
-        values = []
         now = datetime.now(timezone.utc)
-        for h3_idx in h3_indices:
-            score = risk_scores.get(h3_idx, 0.0)
-            values.append((
+        metadata = json.dumps({"source": "generate-h3-grid-ci", "model": "goldrisk_v1"})
+        values = [
+            (
                 h3_idx,
                 resolution,
-                score,
+                risk_scores.get(h3_idx, 0.0),
                 0,     # site_count initial
                 0,     # alert_count initial
                 0.0,   # water_risk initial
                 0.0,   # deforestation_risk initial
                 now,   # computed_at
-                json.dumps({"source": "generate-h3-grid-ci", "model": "goldrisk_v1"}),
-            ))
-
-        # Upsert : inserer ou mettre a jour si l'hexagone existe deja
-        query = """
-            INSERT INTO h3_risk_scores (
-                h3_index, resolution, risk_score,
-                site_count, alert_count, water_risk, deforestation_risk,
-                computed_at, metadata
-            ) VALUES %s
-            ON CONFLICT (h3_index, resolution)
-            DO UPDATE SET
-                risk_score = EXCLUDED.risk_score,
-                computed_at = EXCLUDED.computed_at,
-                metadata = EXCLUDED.metadata,
-                updated_at = NOW()
-        """
-
-        # Inserer par batch de 500
-        batch_size = 500
-        total_inserted = 0
-
-        for i in range(0, len(values), batch_size):
-            batch = values[i:i + batch_size]
-            execute_values(cursor, query, batch)
-            total_inserted += len(batch)
-            logger.info(
-                f"Batch insere : {total_inserted}/{len(values)} "
-                f"({total_inserted / len(values) * 100:.0f}%)"
+                metadata,
             )
+            for h3_idx in h3_indices
+        ]
+
+        # COPY vers une table temporaire puis un seul upsert ; repli sur
+        # execute_values si COPY echoue (droits, proxy sans COPY...)
+        try:
+            total_inserted = _upsert_via_copy(cursor, values)
+        except psycopg2.Error as e:
+            conn.rollback()
+            logger.warning(f"COPY indisponible ({e}), repli sur execute_values")
+            total_inserted = _upsert_via_values(cursor, values, execute_values)
 
         conn.commit()
         cursor.close()
@@ -401,6 +499,64 @@ def insert_into_database(
         return 0
 
 
+# Colonnes ecrites dans h3_risk_scores (ordre des tuples de valeurs)
+H3_RISK_COLUMNS = (
+    "h3_index", "resolution", "risk_score",
+    "site_count", "alert_count", "water_risk", "deforestation_risk",
+    "computed_at", "metadata",
+)
+
+# Mise a jour en cas de conflit sur (h3_index, resolution)
+H3_RISK_ON_CONFLICT = """
+    ON CONFLICT (h3_index, resolution)
+    DO UPDATE SET
+        risk_score = EXCLUDED.risk_score,
+        computed_at = EXCLUDED.computed_at,
+        metadata = EXCLUDED.metadata,
+        updated_at = NOW()
+"""
+
+
+def _upsert_via_copy(cursor, values: list[tuple]) -> int:
+    """
+    Upsert via ``COPY`` dans une table temporaire puis ``INSERT ... SELECT``.
+
+    Un seul aller-retour pour les donnees au lieu d'un INSERT par lot.
+    La table temporaire est supprimee au commit.
+    """
+    columns = ", ".join(H3_RISK_COLUMNS)
+    cursor.execute(
+        "CREATE TEMP TABLE h3_risk_tmp "
+        "(LIKE h3_risk_scores INCLUDING DEFAULTS) ON COMMIT DROP"
+    )
+
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    for row in values:
+        writer.writerow(row[:7] + (row[7].isoformat(), row[8]))
+    buf.seek(0)
+    cursor.copy_expert(
+        f"COPY h3_risk_tmp ({columns}) FROM STDIN WITH (FORMAT csv)", buf,
+    )
+    logger.info(f"COPY : {len(values)} lignes chargees dans h3_risk_tmp")
+
+    cursor.execute(
+        f"INSERT INTO h3_risk_scores ({columns}) "
+        f"SELECT {columns} FROM h3_risk_tmp" + H3_RISK_ON_CONFLICT
+    )
+    return cursor.rowcount
+
+
+def _upsert_via_values(cursor, values: list[tuple], execute_values) -> int:
+    """Upsert via ``execute_values`` par pages de 5000 lignes (repli)."""
+    query = (
+        f"INSERT INTO h3_risk_scores ({', '.join(H3_RISK_COLUMNS)}) VALUES %s"
+        + H3_RISK_ON_CONFLICT
+    )
+    execute_values(cursor, query, values, page_size=5000)
+    return len(values)
+
+
 # ---------------------------------------------------------------------------
 # Export GeoJSON
 # ---------------------------------------------------------------------------
@@ -418,8 +574,16 @@ def export_geojson(geojson: dict, output_path: Path) -> None:
     """
     output_path.parent.mkdir(parents=True, exist_ok=True)
 
-    with open(output_path, "w", encoding="utf-8") as f:
-        json.dump(geojson, f, ensure_ascii=False, indent=2)
+    # orjson (optionnel) serialise nettement plus vite que json
+    try:
+        import orjson
+    except ImportError:
+        with open(output_path, "w", encoding="utf-8") as f:
+            json.dump(geojson, f, ensure_ascii=False, indent=2)
+    else:
+        output_path.write_bytes(
+            orjson.dumps(geojson, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY)
+        )
 
     file_size_mb = output_path.stat().st_size / (1024 * 1024)
     logger.info(
@@ -0,0 +1,17 @@
+-- =============================================================
+-- Ge O'Miner - Migration : index couvrant du moniteur de drift
+-- A appliquer sur les bases existantes (deja inclus dans schema.sql)
+--
+--   psql "$DATABASE_URL" -f scripts/migration_drift_index.sql
+--
+-- CONCURRENTLY ne peut pas s'executer dans une transaction :
+-- ne pas lancer ce fichier avec --single-transaction.
+-- =============================================================
+
+-- Transforme la requete de ml/experiments/monitor_drift.py
+-- (ORDER BY detected_at DESC LIMIT N sur confidence_ai non nul)
+-- en index-only scan, sans tri ni parcours complet de la table.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_mining_sites_detected_conf
+    ON mining_sites (detected_at DESC)
+    INCLUDE (confidence_ai)
+    WHERE confidence_ai IS NOT NULL;
@@ -141,6 +141,9 @@ CREATE INDEX idx_mining_sites_h3 ON mining_sites(h3_index_r7);
 CREATE INDEX idx_mining_sites_status_detected ON mining_sites(status, detected_at DESC);
 -- Recherche par code site
 CREATE INDEX idx_mining_sites_code ON mining_sites(site_code);
+-- Index couvrant pour le moniteur de drift (N derniers scores de confiance)
+CREATE INDEX idx_mining_sites_detected_conf ON mining_sites(detected_at DESC)
+    INCLUDE (confidence_ai) WHERE confidence_ai IS NOT NULL;
 
 -- =============================================================
 -- TABLE: alerts
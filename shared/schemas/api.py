@@ -3,15 +3,19 @@ Schemas Pydantic partages pour les API Ge O'Miner.
 
 Ce module definit les schemas de validation pour les requetes
 et reponses des microservices.
+
+Les schemas sont construits a la premiere utilisation (``defer_build``) :
+l'import du module ne compile que ce qui sert reellement au service.
 """
 
 from __future__ import annotations
 
 from datetime import datetime
 from enum import Enum
-from typing import Any
+from functools import lru_cache
+from typing import Annotated, Any, Literal, Union
 
-from pydantic import BaseModel, Field, field_validator
+from pydantic import BaseModel, Field, TypeAdapter
 
 
 # --- Enums ---
@@ -38,6 +42,40 @@ class AlertSeverity(str, Enum):
     CRITICAL = "CRITICAL"
 
 
+# --- Geometries GeoJSON ---
+
+# Position GeoJSON : [lon, lat] ou [lon, lat, altitude]
+Position = Annotated[list[float], Field(min_length=2, max_length=3)]
+
+
+class GeoPoint(BaseModel):
+    """Geometrie GeoJSON Point."""
+
+    type: Literal["Point"]
+    coordinates: Position
+
+
+class GeoPolygon(BaseModel):
+    """Geometrie GeoJSON Polygon (anneau exterieur puis trous eventuels)."""
+
+    type: Literal["Polygon"]
+    coordinates: list[list[Position]]
+
+
+class GeoMultiPolygon(BaseModel):
+    """Geometrie GeoJSON MultiPolygon."""
+
+    type: Literal["MultiPolygon"]
+    coordinates: list[list[list[Position]]]
+
+
+# Union discriminee sur ``type`` : le bon modele est choisi par pydantic-core
+GeoJSONGeometry = Annotated[
+    Union[GeoPoint, GeoPolygon, GeoMultiPolygon],
+    Field(discriminator="type"),
+]
+
+
 # --- Schemas Site Minier ---
 
 
@@ -50,9 +88,9 @@ class SiteCreateSchema(BaseModel):
         max_length=50,
         description="Code unique du site minier",
     )
-    geometry: dict[str, Any] = Field(
+    geometry: GeoJSONGeometry = Field(
         ...,
-        description="Geometrie GeoJSON du site (Polygon ou Point)",
+        description="Geometrie GeoJSON du site (Point, Polygon ou MultiPolygon)",
     )
     h3_index_r7: str | None = Field(
         default=None,
@@ -90,31 +128,8 @@ class SiteCreateSchema(BaseModel):
         description="Notes supplementaires",
     )
 
-    @field_validator("confidence_ai")
-    @classmethod
-    def valider_confiance(cls, v: float | None) -> float | None:
-        """Valide que le score de confiance est dans l'intervalle [0, 1]."""
-        if v is not None and not (0.0 <= v <= 1.0):
-            raise ValueError("Le score de confiance doit etre entre 0 et 1")
-        return v
-
-    @field_validator("geometry")
-    @classmethod
-    def valider_geometrie(cls, v: dict[str, Any]) -> dict[str, Any]:
-        """Valide la structure GeoJSON minimale."""
-        if "type" not in v or "coordinates" not in v:
-            raise ValueError(
-                "La geometrie doit contenir 'type' et 'coordinates'"
-            )
-        types_valides = {"Point", "Polygon", "MultiPolygon"}
-        if v["type"] not in types_valides:
-            raise ValueError(
-                f"Type de geometrie invalide: {v['type']}. "
-                f"Types acceptes: {types_valides}"
-            )
-        return v
-
     model_config = {
+        "defer_build": True,
         "json_schema_extra": {
             "examples": [
                 {
@@ -159,6 +174,7 @@ class SiteUpdateSchema(BaseModel):
     )
 
     model_config = {
+        "defer_build": True,
         "json_schema_extra": {
             "examples": [
                 {
@@ -211,6 +227,7 @@ class AlertCreateSchema(BaseModel):
     )
 
     model_config = {
+        "defer_build": True,
         "json_schema_extra": {
             "examples": [
                 {
@@ -284,7 +301,10 @@ class SensorReadingSchema(BaseModel):
         description="Longitude du capteur",
     )
 
+    # Lecture immuable une fois validee
     model_config = {
+        "defer_build": True,
+        "frozen": True,
         "json_schema_extra": {
             "examples": [
                 {
@@ -302,6 +322,17 @@ class SensorReadingSchema(BaseModel):
     }
 
 
+@lru_cache(maxsize=None)
+def sensor_readings_adapter() -> TypeAdapter[list[SensorReadingSchema]]:
+    """
+    Validateur de lots de lectures capteur, construit a la premiere utilisation.
+
+    ``validate_python`` / ``validate_json`` valident toute la liste en un seul
+    appel a pydantic-core, sans repasser par Python a chaque element.
+    """
+    return TypeAdapter(list[SensorReadingSchema])
+
+
 # --- Schema Transaction Or ---
 
 
@@ -343,6 +374,7 @@ class GoldTransactionSchema(BaseModel):
     )
 
     model_config = {
+        "defer_build": True,
         "json_schema_extra": {
             "examples": [
                 {
@@ -386,7 +418,7 @@ class MinerRegisterSchema(BaseModel):
         max_length=20,
         description="Numero de telephone",
     )
-    zone_polygon: dict[str, Any] | None = Field(
+    zone_polygon: GeoJSONGeometry | None = Field(
         default=None,
         description="Zone de travail autorisee (geometrie GeoJSON)",
     )
@@ -395,18 +427,8 @@ class MinerRegisterSchema(BaseModel):
         description="Identifiant de l'agent ayant enregistre le mineur",
     )
 
-    @field_validator("zone_polygon")
-    @classmethod
-    def valider_zone(cls, v: dict[str, Any] | None) -> dict[str, Any] | None:
-        """Valide la geometrie de la zone si fournie."""
-        if v is not None:
-            if "type" not in v or "coordinates" not in v:
-                raise ValueError(
-                    "La zone doit contenir 'type' et 'coordinates'"
-                )
-        return v
-
     model_config = {
+        "defer_build": True,
         "json_schema_extra": {
             "examples": [
                 {